@@ -1,25 +1,1417 @@
 import socket
 import threading
+import asyncio
+import functools
+import multiprocessing
+import queue
+import selectors
 import time
 import sqlite3
 import hashlib
-from urllib.parse import urlparse
+import gzip
+import re
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from fnmatch import fnmatchcase
+from urllib.parse import quote, urlparse, urlsplit, urlunsplit
 from http.client import HTTPResponse
 from io import BytesIO
 import json
 import os
+import base64
+
+# Optional codecs for precompressed cache variants
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+HOP_BY_HOP_HEADERS = {'connection', 'proxy-connection', 'keep-alive'}
+
+def parse_http_head(head):
+    """Split a raw header block into its start line and a list of (name, value) headers"""
+    lines = head.decode('iso-8859-1').split('\r\n')
+    headers = []
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers.append((name.strip(), value.strip()))
+    return lines[0], headers
+
+def get_header(headers, name, default=None):
+    """Get the value of a header by case-insensitive name"""
+    name = name.lower()
+    for header_name, value in headers:
+        if header_name.lower() == name:
+            return value
+    return default
+
+def build_http_head(start_line, headers):
+    """Serialize a start line and headers back into a raw header block"""
+    lines = [start_line] + [f"{name}: {value}" for name, value in headers]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1')
+
+def is_keep_alive(version, headers):
+    """Whether a message allows its connection to be reused"""
+    tokens = [token.strip().lower() for token in get_header(headers, 'connection', '').split(',')]
+    if version == 'HTTP/1.1':
+        return 'close' not in tokens
+    return 'keep-alive' in tokens
+
+def response_framing(method, status_code, headers):
+    """How the end of a response body is found: ('none'|'chunked'|'length'|'close', length)"""
+    if method == 'HEAD' or 100 <= status_code < 200 or status_code in (204, 304):
+        return 'none', 0
+    if 'chunked' in get_header(headers, 'transfer-encoding', '').lower():
+        return 'chunked', None
+    content_length = get_header(headers, 'content-length')
+    if content_length is not None and content_length.isdigit():
+        return 'length', int(content_length)
+    return 'close', None
+
+def request_framing(headers):
+    """How the end of a request body is found: ('none'|'chunked'|'length', length). Raises
+    ValueError for framing a server could read differently than we do (RFC 9112 section 6.3)"""
+    transfer_codings = [coding.strip().lower() for name, value in headers if name.lower() == 'transfer-encoding'
+                        for coding in value.split(',')]
+    content_lengths = [value.strip() for name, value in headers if name.lower() == 'content-length']
+    if transfer_codings:
+        if content_lengths:
+            raise ValueError("Both Transfer-Encoding and Content-Length")
+        if transfer_codings[-1] != 'chunked':
+            raise ValueError("Request body not chunked last")
+        return 'chunked', None
+    if not content_lengths:
+        return 'none', 0
+    if len(content_lengths) > 1 or not content_lengths[0].isdigit():
+        raise ValueError("Invalid Content-Length")
+    if int(content_lengths[0]) > 0:
+        return 'length', int(content_lengths[0])
+    return 'none', 0
+
+# Status codes a shared cache may store and serve (RFC 9111 heuristically cacheable set)
+CACHEABLE_STATUS_CODES = {200, 203, 300, 301, 308, 404, 410}
+
+# Never copied from a 304 onto the stored response
+NOT_MODIFIED_SKIP_HEADERS = {'content-length', 'transfer-encoding', 'content-encoding', 'content-range'}
+
+# Upstream errors that stale-if-error may hide
+STALE_IF_ERROR_STATUS_CODES = {500, 502, 503, 504}
+
+# The only headers we send with a 304 generated from the cache
+NOT_MODIFIED_HEADERS = {'cache-control', 'content-location', 'date', 'etag', 'expires', 'last-modified', 'vary', 'age'}
+
+def parse_cache_control(value):
+    """Parse a Cache-Control header into {directive: argument or None}"""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, argument = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip().strip('"') if argument else None
+    return directives
+
+def parse_http_date(value):
+    """Parse an HTTP date into a timestamp, None if missing or invalid"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def directive_seconds(directives, name):
+    """Integer argument of a Cache-Control directive, None if absent or malformed"""
+    value = directives.get(name)
+    if value is not None and value.isdigit():
+        return int(value)
+    return None
+
+def freshness_lifetime(headers, response_time):
+    """How long a response stays fresh in seconds (RFC 9111 section 4.2.1)"""
+    directives = parse_cache_control(get_header(headers, 'cache-control'))
+    if 'no-cache' in directives:
+        return 0
+    for name in ('s-maxage', 'max-age'):
+        seconds = directive_seconds(directives, name)
+        if seconds is not None:
+            return seconds
+    
+    date = parse_http_date(get_header(headers, 'date')) or response_time
+    if get_header(headers, 'expires') is not None:
+        # An invalid Expires means already expired
+        expires = parse_http_date(get_header(headers, 'expires'))
+        return max(0, expires - date) if expires else 0
+    
+    # Heuristic freshness: 10% of the time since last modification, at most a day
+    last_modified = parse_http_date(get_header(headers, 'last-modified'))
+    if last_modified:
+        return min(max(0, (date - last_modified) * 0.1), 86400)
+    return 0
+
+def initial_age(headers, response_time):
+    """Age of a response when it was received (RFC 9111 section 4.2.3)"""
+    age = get_header(headers, 'age', '')
+    age = int(age) if age.isdigit() else 0
+    date = parse_http_date(get_header(headers, 'date'))
+    apparent_age = max(0, response_time - date) if date else 0
+    return max(age, apparent_age)
+
+def current_age(headers, stored_at, now):
+    """Age of a cached response now: what it had when stored plus time spent in the cache"""
+    return initial_age(headers, stored_at) + max(0, now - stored_at)
+
+def has_validator(headers):
+    """Whether a response can be revalidated with a conditional request"""
+    return get_header(headers, 'etag') is not None or get_header(headers, 'last-modified') is not None
+
+def is_storable(status_code, headers, request_headers):
+    """Whether a shared cache may store a response to a GET (RFC 9111 section 3)"""
+    if status_code not in CACHEABLE_STATUS_CODES:
+        return False
+    directives = parse_cache_control(get_header(headers, 'cache-control'))
+    if 'no-store' in directives or 'private' in directives:
+        return False
+    if 'no-store' in request_cache_directives(request_headers):
+        return False
+    if get_header(headers, 'vary', '').strip() == '*':
+        return False
+    if get_header(request_headers, 'authorization') is not None and not (
+            {'public', 's-maxage', 'must-revalidate'} & set(directives)):
+        return False
+    # Only worth keeping if it can be served fresh or cheaply revalidated
+    return freshness_lifetime(headers, time.time()) > 0 or has_validator(headers)
+
+def stale_window(headers, directive, default):
+    """Seconds past expiry a response may still be served under a stale-while-revalidate or
+    stale-if-error extension (RFC 5861), the origin's own value wins over our default"""
+    directives = parse_cache_control(get_header(headers, 'cache-control'))
+    if {'must-revalidate', 'proxy-revalidate', 'no-cache'} & set(directives):
+        return 0
+    seconds = directive_seconds(directives, directive)
+    return default if seconds is None else seconds
+
+def request_cache_directives(request_headers):
+    """Cache-Control directives of a request, with Pragma: no-cache folded in"""
+    directives = parse_cache_control(get_header(request_headers, 'cache-control'))
+    if 'no-cache' in get_header(request_headers, 'pragma', '').lower():
+        directives.setdefault('no-cache', None)
+    return directives
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match list against an entity tag"""
+    if if_none_match.strip() == '*':
+        return True
+    if etag is None:
+        return False
+    strip_weak = lambda tag: tag.strip()[2:] if tag.strip().startswith('W/') else tag.strip()
+    return any(strip_weak(tag) == strip_weak(etag) for tag in if_none_match.split(','))
+
+def is_conditional(request_headers):
+    return (get_header(request_headers, 'if-none-match') is not None
+            or get_header(request_headers, 'if-modified-since') is not None)
+
+def validator_matches(request_headers, cached_headers):
+    """Whether the client's own conditional headers match a cached response"""
+    if_none_match = get_header(request_headers, 'if-none-match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, get_header(cached_headers, 'etag'))
+    if_modified_since = parse_http_date(get_header(request_headers, 'if-modified-since'))
+    last_modified = parse_http_date(get_header(cached_headers, 'last-modified'))
+    return bool(if_modified_since and last_modified and last_modified <= if_modified_since)
+
+# Codecs for precompressed cache variants, in order of preference
+COMPRESSORS = {}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda body: brotli.compress(body, quality=5)
+if zstandard is not None:
+    COMPRESSORS['zstd'] = lambda body: zstandard.ZstdCompressor(level=10).compress(body)
+COMPRESSORS['gzip'] = lambda body: gzip.compress(body, compresslevel=6, mtime=0)
+
+# Media types besides text/* that are worth compressing
+COMPRESSIBLE_TYPES = {'application/json', 'application/javascript', 'application/xml', 'application/xhtml+xml',
+                      'application/rss+xml', 'application/atom+xml', 'application/manifest+json', 'image/svg+xml'}
+
+def is_compressible(content_type):
+    media_type = (content_type or '').split(';', 1)[0].strip().lower()
+    return media_type.startswith('text/') or media_type in COMPRESSIBLE_TYPES or media_type.endswith(('+json', '+xml'))
+
+def accepted_encodings(accept_encoding):
+    """Parse an Accept-Encoding header into {coding: qvalue}"""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        qvalue = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        accepted[coding] = qvalue
+    return accepted
+
+def select_encoding(accept_encoding, encodings):
+    """The preferred one of the available encodings the client accepts, None for identity"""
+    accepted = accepted_encodings(accept_encoding)
+    best, best_qvalue = None, 0
+    for encoding in encodings:
+        qvalue = accepted.get(encoding, accepted.get('*', 0))
+        if qvalue > best_qvalue:
+            best, best_qvalue = encoding, qvalue
+    # Identity is always acceptable, but only wins if the client asked for it explicitly
+    if best is None or best_qvalue < accepted.get('identity', 0):
+        return None
+    return best
+
+def vary_on_accept_encoding(headers):
+    """Headers with Accept-Encoding added to Vary"""
+    vary = get_header(headers, 'vary')
+    if vary and (vary.strip() == '*' or 'accept-encoding' in vary_names([('Vary', vary)]).split(',')):
+        return headers
+    headers = [(name, value) for name, value in headers if name.lower() != 'vary']
+    headers.append(('Vary', f"{vary}, Accept-Encoding" if vary else 'Accept-Encoding'))
+    return headers
+
+def encoded_head(head, encoding, length):
+    """Head of the compressed form of a stored response"""
+    status_line, headers = parse_http_head(head)
+    etag = get_header(headers, 'etag')
+    headers = [(name, value) for name, value in headers if name.lower() not in ('content-length', 'etag')]
+    if etag is not None and etag.endswith('"'):
+        # The compressed form is a different representation and needs its own entity tag
+        headers.append(('ETag', f'{etag[:-1]}-{encoding}"'))
+    headers.append(('Content-Encoding', encoding))
+    headers.append(('Content-Length', str(length)))
+    return build_http_head(status_line, vary_on_accept_encoding(headers))
+
+# More ranges than this in one request are ignored and the full response is sent
+MAX_RANGES = 64
+
+def parse_range(value, length):
+    """Resolve a Range header against a body length into sorted, merged [(first, last)] byte
+    positions. None if the header should be ignored, [] if no range is satisfiable"""
+    if not value or not value.strip().lower().startswith('bytes='):
+        return None
+    specs = [spec.strip() for spec in value.split('=', 1)[1].split(',') if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+    ranges = []
+    for spec in specs:
+        first, separator, last = (part.strip() for part in spec.partition('-'))
+        if not separator or (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+            return None
+        if not first:
+            # Suffix range: the last N bytes
+            if int(last) > 0 and length > 0:
+                ranges.append((max(length - int(last), 0), length - 1))
+        elif last and int(last) < int(first):
+            return None
+        elif int(first) < length:
+            ranges.append((int(first), min(int(last), length - 1) if last else length - 1))
+    
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+def if_range_matches(if_range, headers):
+    """Whether an If-Range condition holds for a stored response, which needs a strong validator"""
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        etag = get_header(headers, 'etag')
+        return not if_range.startswith('W/') and etag is not None and etag.strip() == if_range
+    last_modified = parse_http_date(get_header(headers, 'last-modified'))
+    return last_modified is not None and last_modified == parse_http_date(if_range)
+
+def range_response(status_line, headers, ranges, length, part):
+    """Turn a full response into a 206 or 416 for resolved ranges, returns (status code, status line,
+    headers, body segments). part(first, last) gives the segment for a slice of the body"""
+    version = status_line.split(' ', 1)[0]
+    headers = [(name, value) for name, value in headers if name.lower() != 'content-length']
+    if not ranges:
+        headers = [(name, value) for name, value in headers if name.lower() != 'content-type']
+        headers += [('Content-Range', f"bytes */{length}"), ('Content-Length', '0')]
+        return 416, f"{version} 416 Range Not Satisfiable", headers, []
+    
+    if len(ranges) == 1:
+        first, last = ranges[0]
+        headers += [('Content-Range', f"bytes {first}-{last}/{length}"), ('Content-Length', str(last - first + 1))]
+        return 206, f"{version} 206 Partial Content", headers, [part(first, last)]
+    
+    boundary = os.urandom(12).hex()
+    content_type = get_header(headers, 'content-type')
+    segments = []
+    size = 0
+    for first, last in ranges:
+        part_head = f"--{boundary}\r\n"
+        if content_type:
+            part_head += f"Content-Type: {content_type}\r\n"
+        part_head += f"Content-Range: bytes {first}-{last}/{length}\r\n\r\n"
+        segments += [part_head.encode('iso-8859-1'), part(first, last), b'\r\n']
+        size += len(part_head) + last - first + 1 + 2
+    segments.append(f"--{boundary}--\r\n".encode('iso-8859-1'))
+    size += len(segments[-1])
+    headers = [(name, value) for name, value in headers if name.lower() != 'content-type']
+    headers += [('Content-Type', f"multipart/byteranges; boundary={boundary}"), ('Content-Length', str(size))]
+    return 206, f"{version} 206 Partial Content", headers, segments
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Characters that never need percent-encoding (RFC 3986 section 2.3)
+UNRESERVED_CHARACTERS = set('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+
+def normalize_percent_encoding(value):
+    """Decode escaped unreserved characters and upper-case the remaining escapes"""
+    def fix(match):
+        character = chr(int(match.group(0)[1:], 16))
+        return character if character in UNRESERVED_CHARACTERS else match.group(0).upper()
+    return re.sub(r'%[0-9a-fA-F]{2}', fix, value)
+
+def normalize_url(url, host, port, sort_query=False, strip_params=()):
+    """Canonical absolute URL of a request target, so equivalent requests share a cache key.
+    Origin-form targets are resolved against the Host, scheme and host are lower-cased, default
+    ports, fragments and query parameters matching strip_params patterns are dropped"""
+    if '://' not in url:
+        url = f"http://{host}:{port}{url if url.startswith('/') else '/' + url}"
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    hostname = parts.hostname or host.lower()
+    if ':' in hostname:
+        hostname = f"[{hostname}]"
+    netloc = hostname if parts.port in (None, DEFAULT_PORTS.get(scheme)) else f"{hostname}:{parts.port}"
+    
+    params = [param for param in parts.query.split('&')
+              if param and not any(fnmatchcase(param.split('=', 1)[0], pattern) for pattern in strip_params)]
+    if sort_query:
+        # Stable, so repeated parameters keep their relative order
+        params.sort(key=lambda param: param.split('=', 1)[0])
+    query = normalize_percent_encoding('&'.join(params))
+    return urlunsplit((scheme, netloc, normalize_percent_encoding(parts.path) or '/', query, ''))
+
+def vary_names(headers):
+    """Lower-cased, sorted request header names a response varies on, joined with commas"""
+    names = set()
+    for name, value in headers:
+        if name.lower() == 'vary':
+            names.update(part.strip().lower() for part in value.split(',') if part.strip())
+    return ','.join(sorted(names))
+
+def variant_key(base_key, vary, request_headers):
+    """Secondary cache key: the base key plus the request's values for the Vary headers"""
+    if not vary:
+        return base_key
+    values = []
+    for name in vary.split(','):
+        value = get_header(request_headers, name, '')
+        values.append(f"{name}: {','.join(' '.join(part.split()) for part in value.split(','))}")
+    return f"{base_key} [{'; '.join(values)}]"
+
+def entry_headers(entry):
+    """Headers of the response stored in a cache entry"""
+    response_data = entry['response']
+    return parse_http_head(response_data[:response_data.find(b'\r\n\r\n')])[1]
+
+class SocketReader:
+    """Buffered reads of header blocks and exact byte counts from a blocking socket"""
+    
+    def __init__(self, sock, buffer=b''):
+        self.sock = sock
+        self.buffer = bytearray(buffer)
+    
+    def fill(self, size=65536):
+        """Receive more data into the buffer, returns the number of bytes read"""
+        chunk = self.sock.recv(size)
+        self.buffer += chunk
+        return len(chunk)
+    
+    def read_until(self, delimiter, limit=65536):
+        """Read up to and including delimiter, returns b'' if the peer closed first"""
+        start = 0
+        while True:
+            index = self.buffer.find(delimiter, start)
+            if index != -1:
+                end = index + len(delimiter)
+                if end > limit:
+                    raise ValueError("Header block too large")
+                data = bytes(self.buffer[:end])
+                del self.buffer[:end]
+                return data
+            if len(self.buffer) > limit:
+                raise ValueError("Header block too large")
+            start = max(0, len(self.buffer) - len(delimiter) + 1)
+            if not self.fill():
+                if self.buffer:
+                    raise ConnectionError("Connection closed in the middle of a header block")
+                return b''
+    
+    def read_exact(self, size):
+        """Read exactly size bytes"""
+        while len(self.buffer) < size:
+            if not self.fill(max(65536, size - len(self.buffer))):
+                raise ConnectionError("Connection closed before the message was complete")
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+    
+    def read_some(self, size=65536):
+        """Read whatever is buffered, or the next chunk from the socket"""
+        if not self.buffer:
+            self.fill(size)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+    
+    def iter_body(self, framing, length, chunk_size=65536):
+        """Yield a message body in chunks of at most chunk_size bytes"""
+        if framing == 'length':
+            remaining = length
+            while remaining > 0:
+                if not self.buffer and not self.fill(min(chunk_size, remaining)):
+                    raise ConnectionError("Connection closed before the message was complete")
+                data = bytes(self.buffer[:min(chunk_size, remaining)])
+                del self.buffer[:len(data)]
+                remaining -= len(data)
+                yield data
+        elif framing == 'chunked':
+            while True:
+                size_line = self.read_until(b'\r\n')
+                if not size_line:
+                    raise ConnectionError("Connection closed before the message was complete")
+                size = int(size_line.split(b';', 1)[0].strip(), 16)
+                if size == 0:
+                    # Skip any trailer fields up to the closing blank line
+                    while self.read_until(b'\r\n') not in (b'\r\n', b''):
+                        pass
+                    break
+                for data in self.iter_body('length', size, chunk_size):
+                    yield data
+                self.read_exact(2)
+        elif framing == 'close':
+            # No length to go by, only the peer closing ends the body. A read timeout propagates,
+            # a body that stalls is incomplete
+            while True:
+                data = self.read_some(chunk_size)
+                if not data:
+                    break
+                yield data
+
+class ConnectionPool:
+    """Idle keep-alive connections to origin servers, keyed by (host, port)"""
+    
+    def __init__(self, is_healthy, close, max_per_host=8, idle_timeout=30):
+        self.is_healthy = is_healthy
+        self.close = close
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.stats = {'created': 0, 'reused': 0, 'discarded': 0}
+    
+    def checkout(self, key):
+        """Take a healthy idle connection for key, or None if there is none"""
+        while True:
+            with self.lock:
+                connections = self.idle.get(key)
+                if not connections:
+                    return None
+                connection, released_at = connections.pop()
+            
+            if time.time() - released_at < self.idle_timeout and self.is_healthy(connection):
+                with self.lock:
+                    self.stats['reused'] += 1
+                return connection
+            self.discard(connection)
+    
+    def checkin(self, key, connection):
+        """Return a connection whose last response was fully read"""
+        now = time.time()
+        expired = []
+        with self.lock:
+            connections = self.idle.setdefault(key, [])
+            # Drop connections that sat idle for too long while we're here
+            while connections and now - connections[0][1] >= self.idle_timeout:
+                expired.append(connections.pop(0)[0])
+            if len(connections) < self.max_per_host:
+                connections.append((connection, now))
+            else:
+                expired.append(connection)
+        for connection in expired:
+            self.discard(connection)
+    
+    def record_created(self):
+        """Count a freshly opened connection"""
+        with self.lock:
+            self.stats['created'] += 1
+    
+    def discard(self, connection):
+        """Close a connection that won't be reused"""
+        with self.lock:
+            self.stats['discarded'] += 1
+        try:
+            self.close(connection)
+        except Exception:
+            pass
+    
+    def close_all(self):
+        """Close every idle connection"""
+        with self.lock:
+            connections = [connection for entries in self.idle.values() for connection, _ in entries]
+            self.idle = {}
+        for connection in connections:
+            self.discard(connection)
+    
+    def get_stats(self):
+        """Get pool usage statistics"""
+        with self.lock:
+            return dict(self.stats, idle=sum(len(entries) for entries in self.idle.values()))
+
+async def iter_body_async(reader, framing, length, chunk_size=65536, timeout=10):
+    """Yield a message body from an asyncio StreamReader in chunks of at most chunk_size bytes"""
+    if framing == 'length':
+        remaining = length
+        while remaining > 0:
+            data = await asyncio.wait_for(reader.read(min(chunk_size, remaining)), timeout=timeout)
+            if not data:
+                raise ConnectionError("Connection closed before the message was complete")
+            remaining -= len(data)
+            yield data
+    elif framing == 'chunked':
+        while True:
+            size_line = await asyncio.wait_for(reader.readuntil(b'\r\n'), timeout=timeout)
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                # Skip any trailer fields up to the closing blank line
+                while await asyncio.wait_for(reader.readline(), timeout=timeout) not in (b'\r\n', b''):
+                    pass
+                break
+            async for data in iter_body_async(reader, 'length', size, chunk_size, timeout):
+                yield data
+            await asyncio.wait_for(reader.readexactly(2), timeout=timeout)
+    elif framing == 'close':
+        # No length to go by, only the peer closing ends the body. A read timeout propagates,
+        # a body that stalls is incomplete
+        while True:
+            data = await asyncio.wait_for(reader.read(chunk_size), timeout=timeout)
+            if not data:
+                break
+            yield data
+
+def encode_chunk(data):
+    """Frame data as one chunk of a chunked transfer-coded body"""
+    return b'%x\r\n%b\r\n' % (len(data), data)
+
+LAST_CHUNK = b'0\r\n\r\n'
+
+class TunnelDirection:
+    """One direction of a CONNECT tunnel, moving bytes from src to dst.
+    Uses os.splice through a pipe where available so the payload never enters
+    Python, otherwise recv_into a buffer that is reused for the whole tunnel."""
+    
+    SPLICE_FLAGS = getattr(os, 'SPLICE_F_MOVE', 0) | getattr(os, 'SPLICE_F_NONBLOCK', 0)
+    
+    def __init__(self, src, dst, buffer_size=65536):
+        self.src = src
+        self.dst = dst
+        self.buffer_size = buffer_size
+        self.pending = 0
+        self.eof = False
+        self.transferred = 0
+        self.use_splice = hasattr(os, 'splice')
+        if self.use_splice:
+            self.pipe_read, self.pipe_write = os.pipe()
+        else:
+            self.buffer = bytearray(buffer_size)
+            self.view = memoryview(self.buffer)
+            self.offset = 0
+    
+    def wants_read(self):
+        return not self.eof and not self.pending
+    
+    def wants_write(self):
+        return self.pending > 0
+    
+    def read(self):
+        """Pull the next chunk from src, then push as much of it to dst as possible"""
+        try:
+            if self.use_splice:
+                count = os.splice(self.src.fileno(), self.pipe_write, self.buffer_size, flags=self.SPLICE_FLAGS)
+            else:
+                count = self.src.recv_into(self.buffer)
+                self.offset = 0
+        except BlockingIOError:
+            return
+        
+        if count == 0:
+            # Pass the half-close on so the other side sees end of stream
+            self.eof = True
+            try:
+                self.dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+            return
+        self.pending = count
+        self.write()
+    
+    def write(self):
+        """Push pending bytes to dst"""
+        try:
+            if self.use_splice:
+                count = os.splice(self.pipe_read, self.dst.fileno(), self.pending, flags=self.SPLICE_FLAGS)
+            else:
+                count = self.dst.send(self.view[self.offset:self.offset + self.pending])
+                self.offset += count
+        except BlockingIOError:
+            return
+        self.pending -= count
+        self.transferred += count
+    
+    def close(self):
+        if self.use_splice:
+            os.close(self.pipe_read)
+            os.close(self.pipe_write)
+
+class Tunnel:
+    """Both directions of one CONNECT tunnel, and when it last had anything to do"""
+    
+    def __init__(self, client_socket, server_socket, on_close):
+        self.client_socket = client_socket
+        self.server_socket = server_socket
+        self.upstream = TunnelDirection(client_socket, server_socket)
+        self.downstream = TunnelDirection(server_socket, client_socket)
+        self.on_close = on_close
+        self.last_activity = time.time()
+        self.registered = {}
+        client_socket.setblocking(False)
+        server_socket.setblocking(False)
+    
+    def is_open(self):
+        return (self.upstream.wants_read() or self.upstream.pending or
+                self.downstream.wants_read() or self.downstream.pending)
+    
+    def handle(self, sock, events):
+        """Move what the ready socket allows"""
+        if sock is self.client_socket:
+            reading, writing = self.upstream, self.downstream
+        else:
+            reading, writing = self.downstream, self.upstream
+        if events & selectors.EVENT_WRITE and writing.wants_write():
+            writing.write()
+        if events & selectors.EVENT_READ and reading.wants_read():
+            reading.read()
+        self.last_activity = time.time()
+    
+    def register(self, selector):
+        """Watch a socket for reading while its outgoing direction has nothing pending,
+        and for writing while its incoming direction has bytes waiting"""
+        for sock, reading, writing in ((self.client_socket, self.upstream, self.downstream),
+                                       (self.server_socket, self.downstream, self.upstream)):
+            events = ((selectors.EVENT_READ if reading.wants_read() else 0) |
+                      (selectors.EVENT_WRITE if writing.wants_write() else 0))
+            current = self.registered.get(sock, 0)
+            if events != current:
+                if not events:
+                    selector.unregister(sock)
+                elif not current:
+                    selector.register(sock, events, self)
+                else:
+                    selector.modify(sock, events, self)
+                self.registered[sock] = events
+    
+    def close(self, selector):
+        for sock, events in self.registered.items():
+            if events:
+                selector.unregister(sock)
+        self.registered = {}
+        self.upstream.close()
+        self.downstream.close()
+        self.client_socket.close()
+        self.server_socket.close()
+        self.on_close(self.upstream.transferred, self.downstream.transferred)
+
+class TunnelRelay:
+    """Relays every open CONNECT tunnel on one thread with a selector, so a tunnel doesn't hold on
+    to a worker for as long as it stays open. A tunnel closes when both sides are done or it has
+    been idle for idle_timeout"""
+    
+    def __init__(self, idle_timeout):
+        self.idle_timeout = idle_timeout
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.wakeup = None
+        self.tunnels = set()
+    
+    def add(self, client_socket, server_socket, on_close):
+        """Take over both sockets of an established tunnel, on_close(bytes sent upstream,
+        bytes sent downstream) is called from the relay thread once it's closed"""
+        with self.lock:
+            if self.thread is None:
+                self.wakeup = socket.socketpair()
+                self.thread = threading.Thread(target=self.run, name='tunnel-relay', daemon=True)
+                self.thread.start()
+            self.pending.put(Tunnel(client_socket, server_socket, on_close))
+            self.wakeup[1].send(b'\0')
+    
+    def stop(self):
+        """Close every tunnel and stop the relay thread"""
+        with self.lock:
+            if self.thread is None:
+                return
+            self.pending.put(None)
+            self.wakeup[1].send(b'\0')
+            thread, self.thread = self.thread, None
+        thread.join(timeout=10)
+    
+    def get_open_count(self):
+        return len(self.tunnels)
+    
+    def run(self):
+        wakeup_read, wakeup_write = self.wakeup
+        selector = selectors.DefaultSelector()
+        selector.register(wakeup_read, selectors.EVENT_READ)
+        running = True
+        while running:
+            deadline = min((tunnel.last_activity for tunnel in self.tunnels), default=None)
+            timeout = None if deadline is None else max(0, deadline + self.idle_timeout - time.time())
+            touched = set()
+            for key, events in selector.select(timeout=timeout):
+                if key.fileobj is wakeup_read:
+                    wakeup_read.recv(4096)
+                    while not self.pending.empty():
+                        tunnel = self.pending.get()
+                        if tunnel is None:
+                            running = False
+                        else:
+                            self.tunnels.add(tunnel)
+                            touched.add(tunnel)
+                    continue
+                tunnel = key.data
+                try:
+                    tunnel.handle(key.fileobj, events)
+                except OSError:
+                    tunnel.upstream.eof = tunnel.downstream.eof = True
+                    tunnel.upstream.pending = tunnel.downstream.pending = 0
+                touched.add(tunnel)
+            
+            idle_before = time.time() - self.idle_timeout
+            for tunnel in list(self.tunnels):
+                if not running or tunnel.last_activity <= idle_before or (tunnel in touched and not tunnel.is_open()):
+                    self.tunnels.discard(tunnel)
+                    self.close_tunnel(tunnel, selector)
+                elif tunnel in touched:
+                    tunnel.register(selector)
+        
+        selector.close()
+        wakeup_read.close()
+        wakeup_write.close()
+    
+    def close_tunnel(self, tunnel, selector):
+        try:
+            tunnel.close(selector)
+        except Exception as e:
+            print(f"Error closing tunnel: {e}")
+
+class Flight:
+    """One upstream fetch shared by concurrent misses for the same URL. The leader publishes the
+    response head and body chunks as they arrive, followers replay them to their own clients"""
+    
+    def __init__(self):
+        self.response = None
+        self.variant = None
+        self.chunks = []
+        self.done = False
+        self.complete = False
+        self.condition = threading.Condition()
+    
+    def notify(self):
+        self.condition.notify_all()
+    
+    def publish(self, status_line, headers, framing, length, variant):
+        """Make the response available to followers whose requests select the same variant"""
+        with self.condition:
+            self.response = (status_line, headers, framing, length)
+            self.variant = variant
+            self.notify()
+    
+    def matches(self, request_headers):
+        """Whether a follower's request selects the published variant of the response"""
+        return variant_key('', vary_names(self.response[1]), request_headers) == self.variant
+    
+    def add_chunk(self, chunk):
+        with self.condition:
+            self.chunks.append(chunk)
+            self.notify()
+    
+    def finish(self, complete):
+        """End the fetch, unpublished or incomplete fetches send followers back upstream"""
+        with self.condition:
+            if not self.done:
+                self.done = True
+                self.complete = complete and self.response is not None
+                self.notify()
+    
+    @property
+    def failed(self):
+        return self.done and not self.complete
+    
+    def wait_response(self, timeout=30):
+        """Wait for the response head, returns None if the fetch can't be shared"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.response is not None or self.done, timeout)
+            return None if self.failed else self.response
+    
+    def iter_chunks(self, timeout=30):
+        """Yield body chunks as the leader receives them, raises ConnectionError if it fails"""
+        index = 0
+        while True:
+            with self.condition:
+                if not self.condition.wait_for(lambda: index < len(self.chunks) or self.done, timeout):
+                    raise ConnectionError("Timed out waiting for shared response")
+                chunks = self.chunks[index:]
+                failed = self.failed
+            if failed:
+                raise ConnectionError("Shared upstream fetch failed")
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+            if self.done and index == len(self.chunks):
+                return
+
+class AsyncFlight(Flight):
+    """Flight whose followers are coroutines on the event loop"""
+    
+    def __init__(self):
+        super().__init__()
+        self.changed = asyncio.Event()
+    
+    def notify(self):
+        # Wake everyone waiting on the current event, later waiters get a fresh one
+        self.changed.set()
+        self.changed = asyncio.Event()
+    
+    async def wait_changed(self, deadline):
+        try:
+            await asyncio.wait_for(self.changed.wait(), max(0, deadline - time.time()))
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    async def wait_response_async(self, timeout=30):
+        """Wait for the response head, returns None if the fetch can't be shared"""
+        deadline = time.time() + timeout
+        while self.response is None and not self.done:
+            if not await self.wait_changed(deadline):
+                return None
+        return None if self.failed else self.response
+    
+    async def iter_chunks_async(self, timeout=30):
+        """Yield body chunks as the leader receives them, raises ConnectionError if it fails"""
+        index = 0
+        while True:
+            while index == len(self.chunks) and not self.done:
+                if not await self.wait_changed(time.time() + timeout):
+                    raise ConnectionError("Timed out waiting for shared response")
+            if self.failed:
+                raise ConnectionError("Shared upstream fetch failed")
+            chunks = self.chunks[index:]
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+            if self.done and index == len(self.chunks):
+                return
+
+class MemoryCache:
+    """Byte-budgeted LRU of hot cache entries kept in front of the SQLite cache"""
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        """Get an entry and mark it most recently used, None if absent"""
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            self.entries.move_to_end(key)
+            return item[0]
+    
+    def put(self, key, value, size):
+        """Store an entry, evicting the least recently used ones to stay within budget"""
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+    
+    def pop(self, key):
+        """Remove an entry if present"""
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+    
+    def get_stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'size_kb': round(self.size / 1024, 2),
+                'max_kb': round(self.max_bytes / 1024, 2)
+            }
+
+class BlobStore:
+    """Content-addressed response bodies on disk, sharded as <root>/ab/cd/<sha256>"""
+    
+    def __init__(self, root):
+        self.root = root
+    
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+    
+    def put(self, body):
+        """Store a body, returns its digest. Identical bodies share one file"""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a temporary name so readers never see a partial file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as blob:
+            blob.write(body)
+        os.replace(temp_path, path)
+        return digest
+    
+    def read(self, digest):
+        with open(self.path(digest), 'rb') as blob:
+            return blob.read()
+    
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+    
+    def clear(self):
+        """Remove every stored body"""
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+class Metrics:
+    """Counters kept up to date in memory so statistics never scan tables. Each process counts its
+    own changes on top of the values read from the database at startup"""
+    
+    def __init__(self):
+        self.base = {}
+        self.deltas = {}
+        self.lock = threading.Lock()
+    
+    def seed(self, values):
+        self.base.update(values)
+    
+    def add(self, name, amount=1):
+        with self.lock:
+            self.deltas[name] = self.deltas.get(name, 0) + amount
+    
+    def reset(self, name, others=0):
+        """Bring a counter back to zero, including the changes counted by other processes"""
+        with self.lock:
+            self.base[name] = -self.deltas.get(name, 0) - others
+    
+    def get(self, name, others=0):
+        """Current value, plus the changes counted by other processes"""
+        return self.base.get(name, 0) + self.deltas.get(name, 0) + others
+    
+    def names(self):
+        return set(self.base) | set(self.deltas)
+    
+    def snapshot(self):
+        """This process's changes, for reporting to the supervisor"""
+        with self.lock:
+            return dict(self.deltas)
+
+def sse_message(event, data):
+    """A server-sent event carrying data as JSON"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class EventBus:
+    """Fans events out to subscriber queues, formatted once as server-sent events. A subscriber that
+    falls behind loses events instead of holding up the publisher"""
+    
+    def __init__(self, max_pending=256):
+        self.max_pending = max_pending
+        self.subscribers = set()
+        self.dropped = 0
+        self.lock = threading.Lock()
+    
+    def subscribe(self):
+        subscriber = queue.Queue(self.max_pending)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+    
+    def has_subscribers(self):
+        return bool(self.subscribers)
+    
+    def publish(self, event, data):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        message = sse_message(event, data)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                with self.lock:
+                    self.dropped += 1
+
+def cache_metrics(content_type, count, size):
+    """Metrics counter changes for count entries of a content type totalling size bytes"""
+    return {
+        'cached_items': count,
+        'cache_size': size,
+        f"cached_items:{content_type}": count,
+        f"cache_size:{content_type}": size
+    }
+
+class Database:
+    """SQLite shared by all threads: writes run one at a time on a writer thread that owns the only
+    read-write connection, reads use a pool of read-only connections so they never wait for writes"""
+    
+    def __init__(self, path, synchronous='NORMAL', max_readers=8, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self.writer = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        # Readers don't block the writer, and commits don't wait for a full fsync unless asked to
+        self.writer.execute("PRAGMA journal_mode = WAL")
+        self.writer.execute(f"PRAGMA synchronous = {synchronous}")
+        self.jobs = queue.Queue()
+        self.readers = queue.LifoQueue()
+        self.max_readers = max_readers
+        self.reader_count = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.write_loop, name='sqlite-writer', daemon=True)
+        self.thread.start()
+    
+    def write(self, job, *args):
+        """Run job(connection, *args) on the writer thread and commit, returns its result"""
+        if threading.current_thread() is self.thread:
+            # A job calling another write, it's already in the writer's transaction
+            return job(self.writer, *args)
+        future = Future()
+        self.jobs.put((job, args, future))
+        return future.result()
+    
+    def write_loop(self):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                return
+            job, args, future = item
+            try:
+                result = job(self.writer, *args)
+                self.writer.commit()
+                future.set_result(result)
+            except Exception as e:
+                self.writer.rollback()
+                future.set_exception(e)
+    
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection from the pool"""
+        try:
+            connection = self.readers.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.reader_count < self.max_readers
+                if create:
+                    self.reader_count += 1
+            if create:
+                connection = sqlite3.connect(f"file:{quote(os.path.abspath(self.path))}?mode=ro", uri=True,
+                                             timeout=self.timeout, check_same_thread=False)
+            else:
+                connection = self.readers.get()
+        try:
+            yield connection
+        finally:
+            self.readers.put(connection)
+    
+    def fetchone(self, query, parameters=()):
+        with self.reader() as connection:
+            return connection.execute(query, parameters).fetchone()
+    
+    def fetchall(self, query, parameters=()):
+        with self.reader() as connection:
+            return connection.execute(query, parameters).fetchall()
+    
+    def close(self):
+        """Finish the queued writes and close every connection"""
+        self.jobs.put(None)
+        self.thread.join(timeout=10)
+        self.writer.close()
+        while True:
+            try:
+                self.readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+def url_host(url):
+    """Lower-case host name of an absolute URL, cache key or CONNECT authority, '' if it has none"""
+    try:
+        return urlsplit(url if '://' in url else f"//{url}").hostname or ''
+    except ValueError:
+        return ''
+
+def prefix_bounds(prefix):
+    """(low, high) so that low <= value < high holds exactly for the strings starting with prefix,
+    letting a prefix match use an index"""
+    for i in range(len(prefix) - 1, -1, -1):
+        if ord(prefix[i]) < 0x10ffff:
+            return prefix, prefix[:i] + chr(ord(prefix[i]) + 1)
+    return prefix, None
+
+def encode_cursor(values):
+    """Opaque page cursor for the sort key values of the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, count):
+    """Sort key values from a cursor made by encode_cursor, raises ValueError if it isn't one"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(values, list) or len(values) != count:
+        raise ValueError("invalid cursor")
+    return values
+
+def ensure_columns(cursor, table, columns):
+    """Add columns missing from a table created by an older version"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+def sum_stats(reports):
+    """Add up numeric counters of several stats dicts with the same shape"""
+    total = {}
+    for report in reports:
+        for name, value in report.items():
+            if isinstance(value, dict):
+                total[name] = sum_stats([total.get(name, {}), value])
+            elif isinstance(value, (int, float)):
+                total[name] = round(total.get(name, 0) + value, 2)
+    return total
+
+def is_socket_healthy(sock):
+    """An idle upstream socket is usable if it's neither closed nor carrying stray data"""
+    try:
+        sock.settimeout(0)
+        sock.recv(1, socket.MSG_PEEK)
+        return False
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+
+def is_stream_healthy(connection):
+    """An idle asyncio (reader, writer) pair is usable if the origin hasn't closed it"""
+    reader, writer = connection
+    return not writer.is_closing() and not reader.at_eof()
+
+def close_stream(connection):
+    """Close an asyncio (reader, writer) pair"""
+    connection[1].close()
 
 class HTTPProxyServer:
-    def __init__(self, host='localhost', port=8080, cache_enabled=True):
+    ENGINES = ('threaded', 'asyncio')
+    EVICTION_POLICIES = ('lru', 'lfu')
+    LOG_OVERFLOW_POLICIES = ('drop', 'sample')
+    SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+    # Indexed columns each cache browser order walks, rowid breaks ties
+    CACHE_SORT_KEYS = {'timestamp': ('timestamp',), 'size': ('size',), 'hits': ('hits', 'last_access')}
+    LOG_GROUP_COLUMNS = ('client_ip', 'host', 'method', 'status_code')
+    MAX_PAGE_SIZE = 500
+    
+    def __init__(self, host='localhost', port=8080, cache_enabled=True, engine='threaded',
+                 max_workers=64, max_queue=256, backlog=128, processes=1,
+                 upstream_max_per_host=8, upstream_idle_timeout=30, client_idle_timeout=15,
+                 cache_max_object_size=10 * 1024 * 1024, max_header_size=65536, tunnel_idle_timeout=300,
+                 memory_cache_size=64 * 1024 * 1024, cache_max_size=1024 * 1024 * 1024, cache_max_entries=100000,
+                 cache_eviction='lru', cache_maintenance_interval=5, stale_while_revalidate=0, stale_if_error=0,
+                 refresh_workers=4, refresh_queue_size=64,
+                 cache_sort_query=False, cache_strip_params=('utm_*', 'gclid', 'fbclid', 'mc_cid', 'mc_eid'),
+                 cache_blob_dir='cache_blobs', cache_blob_min_size=64 * 1024, cache_compress=False,
+                 cache_compress_min_size=1024, cache_compress_workers=2, cache_compress_queue_size=64,
+                 log_queue_size=10000, log_batch_size=500, log_flush_interval=0.5,
+                 log_overflow='drop', log_sample_rate=10, sqlite_synchronous='NORMAL', sqlite_readers=8,
+                 event_interval=1.0):
+        # Remember the constructor arguments so worker processes can build an identical server
+        self.options = {name: value for name, value in locals().items() if name != 'self'}
+        
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {self.ENGINES}")
+        if cache_eviction not in self.EVICTION_POLICIES:
+            raise ValueError(f"Unknown cache eviction policy '{cache_eviction}', expected one of {self.EVICTION_POLICIES}")
+        if log_overflow not in self.LOG_OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown log overflow policy '{log_overflow}', expected one of {self.LOG_OVERFLOW_POLICIES}")
+        if sqlite_synchronous.upper() not in self.SYNCHRONOUS_MODES:
+            raise ValueError(f"Unknown SQLite synchronous mode '{sqlite_synchronous}', expected one of {self.SYNCHRONOUS_MODES}")
+        if processes > 1 and not hasattr(socket, 'SO_REUSEPORT'):
+            raise ValueError("Multiple worker processes require SO_REUSEPORT support")
+        
         self.host = host
         self.port = port
         self.cache_enabled = cache_enabled
+        self.cache_max_object_size = cache_max_object_size
+        self.engine = engine
+        self.backlog = backlog
+        self.client_idle_timeout = client_idle_timeout
+        self.max_header_size = max_header_size
+        self.tunnel_idle_timeout = tunnel_idle_timeout
+        # Established CONNECT tunnels of the threaded engine, all relayed by one thread
+        self.tunnel_relay = TunnelRelay(tunnel_idle_timeout)
         self.blocked_domains = set()
         self.request_logs = []
-        self.cache = {}
+        self.sqlite_synchronous = sqlite_synchronous.upper()
+        self.sqlite_readers = sqlite_readers
+        self.db = None
+        self.metrics = Metrics()
+        
+        # Request logs are queued and written in batches by a background thread, never in the request path
+        self.log_queue = queue.Queue(maxsize=log_queue_size)
+        self.log_batch_size = log_batch_size
+        self.log_flush_interval = log_flush_interval
+        self.log_overflow = log_overflow
+        self.log_sample_rate = log_sample_rate
+        self.log_writer = None
+        self.log_lock = threading.Lock()
+        self.log_stats = {'queued': 0, 'written': 0, 'dropped': 0, 'sampled_out': 0}
+        self.log_sample_counter = 0
+        
+        # Dashboard updates are computed once per event_interval and pushed to every subscribed stream
+        self.events = EventBus()
+        self.event_interval = event_interval
+        self.event_lock = threading.Lock()
+        self.published_stats = {}
+        self.published_cache_stats = None
+        self.published_log_id = None
+        # Hot objects are served from memory without touching SQLite
+        self.cache = MemoryCache(memory_cache_size)
+        self.cache_counters = {
+            'memory': {'hits': 0, 'misses': 0},
+            'sqlite': {'hits': 0, 'misses': 0}
+        }
+        self.cache_counters_lock = threading.Lock()
+        
+        # Bounds on the SQLite cache, enforced by the maintenance thread
+        self.cache_max_size = cache_max_size
+        self.cache_max_entries = cache_max_entries
+        self.cache_eviction = cache_eviction
+        self.cache_maintenance_interval = cache_maintenance_interval
+        self.cache_evictions = 0
+        # Accesses since the last flush, {url: [last_access, hits]}, so hits never write to SQLite
+        self.cache_accesses = {}
+        self.cache_accesses_lock = threading.Lock()
+        
+        # Upstream fetches in progress that concurrent misses for the same URL can join
+        self.flights = {}
+        self.flights_lock = threading.Lock()
+        self.coalescing_stats = {'fetches': 0, 'coalesced': 0, 'fallbacks': 0}
+        
+        # Cache key normalization, and the Vary header names last seen for each normalized URL
+        self.cache_sort_query = cache_sort_query
+        self.cache_strip_params = tuple(cache_strip_params)
+        self.vary_index = MemoryCache(4 * 1024 * 1024)
+        
+        # Default stale-while-revalidate / stale-if-error windows for origins that don't send them
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        # Background refreshes and range fills run on refresh_workers threads (or as many tasks), and
+        # are dropped while refresh_queue_size others are waiting
+        self.refresh_workers = refresh_workers
+        self.refresh_queue = queue.Queue(maxsize=refresh_queue_size)
+        self.refreshers = []
+        
+        # Bodies of at least cache_blob_min_size live in files and are sent with sendfile(),
+        # SQLite keeps their head and metadata. None keeps every body in SQLite
+        self.blob_store = BlobStore(cache_blob_dir)
+        self.cache_blob_min_size = cache_blob_min_size
+        
+        # Compressed variants of compressible responses, made after they're cached by a few background
+        # threads. Entries cached while cache_compress_queue_size others are waiting stay uncompressed
+        self.cache_compress = cache_compress
+        self.cache_compress_min_size = cache_compress_min_size
+        self.cache_compress_workers = cache_compress_workers
+        self.compress_queue = queue.Queue(maxsize=cache_compress_queue_size)
+        self.compressors = []
         self.is_running = False
         self.server_socket = None
         
+        # Bounded worker pool for the threaded engine
+        self.max_workers = max_workers
+        self.work_queue = queue.Queue(maxsize=max_queue)
+        self.workers = []
+        self.pool_lock = threading.Lock()
+        self.pool_stats = {
+            'handled': 0,
+            'rejected': 0,
+            'total_queue_wait': 0.0,
+            'max_queue_wait': 0.0
+        }
+        
+        # Keep-alive connections to origin servers, one pool per engine
+        self.upstream_pool = ConnectionPool(is_socket_healthy, socket.socket.close,
+                                            upstream_max_per_host, upstream_idle_timeout)
+        self.async_upstream_pool = ConnectionPool(is_stream_healthy, close_stream,
+                                                  upstream_max_per_host, upstream_idle_timeout)
+        
+        # Worker processes sharing the port (supervisor side)
+        self.processes = processes
+        self.worker_processes = {}
+        self.process_stats = {}
+        self.stats_queue = None
+        
+        # Event loop state for the asyncio engine
+        self.loop = None
+        self.async_stop_event = None
+        self.background_tasks = set()
+        
         # Create templates and static directories if they don't exist
         self.create_directories()
         
@@ -110,7 +1502,7 @@ class HTTPProxyServer:
                     </div>
                     <div class="stat-content">
                         <h3>Total Requests</h3>
-                        <div class="stat-value">{{ stats.total_requests }}</div>
+                        <div id="totalRequests" class="stat-value">{{ stats.total_requests }}</div>
                         <div class="stat-trend">
                             <i class="fas fa-chart-line"></i>
                             <span>Real-time tracking</span>
@@ -124,8 +1516,8 @@ class HTTPProxyServer:
                     </div>
                     <div class="stat-content">
                         <h3>Cached Items</h3>
-                        <div class="stat-value">{{ cache_stats.total_cached }}</div>
-                        <div class="stat-subtext">{{ cache_stats.cache_size_kb }} kB</div>
+                        <div id="cachedItems" class="stat-value">{{ cache_stats.total_cached }}</div>
+                        <div class="stat-subtext"><span id="cacheSize">{{ cache_stats.cache_size_kb }}</span> kB</div>
                     </div>
                     <a href="{{ url_for('cache_view') }}" class="stat-action">
                         <i class="fas fa-external-link-alt"></i>
@@ -138,7 +1530,7 @@ class HTTPProxyServer:
                     </div>
                     <div class="stat-content">
                         <h3>Blocked Domains</h3>
-                        <div class="stat-value">{{ stats.blocked_domains }}</div>
+                        <div id="blockedCount" class="stat-value">{{ stats.blocked_domains }}</div>
                         <div class="stat-subtext">Access restricted</div>
                     </div>
                 </div>
@@ -149,7 +1541,7 @@ class HTTPProxyServer:
                     </div>
                     <div class="stat-content">
                         <h3>Cache Status</h3>
-                        <div class="stat-value">{{ 'Enabled' if proxy_server.cache_enabled else 'Disabled' }}</div>
+                        <div id="cacheStatus" class="stat-value">{{ 'Enabled' if proxy_server.cache_enabled else 'Disabled' }}</div>
                         <div class="stat-subtext">Performance mode</div>
                     </div>
                 </div>
@@ -191,8 +1583,7 @@ class HTTPProxyServer:
                     <div class="panel-content">
                         <div class="blocked-list">
                             <h3>Blocked Domains</h3>
-                            {% if blocked_domains %}
-                            <div class="domain-list">
+                            <div id="domainList" class="domain-list">
                                 {% for domain in blocked_domains %}
                                 <div class="domain-item">
                                     <span class="domain-name">{{ domain }}</span>
@@ -202,12 +1593,10 @@ class HTTPProxyServer:
                                 </div>
                                 {% endfor %}
                             </div>
-                            {% else %}
-                            <div class="empty-state">
+                            <div id="noBlockedDomains" class="empty-state" {{ 'hidden' if blocked_domains else '' }}>
                                 <i class="fas fa-check-circle"></i>
                                 <p>No domains blocked</p>
                             </div>
-                            {% endif %}
                         </div>
                         <div class="add-domain-form">
                             <div class="input-group">
@@ -232,8 +1621,7 @@ class HTTPProxyServer:
                     </a>
                 </div>
                 <div class="panel-content">
-                    {% if recent_logs %}
-                    <div class="activity-list">
+                    <div id="activityList" class="activity-list">
                         {% for log in recent_logs %}
                         <div class="activity-item">
                             <div class="activity-icon {{ log.method.lower() }}">
@@ -253,13 +1641,11 @@ class HTTPProxyServer:
                         </div>
                         {% endfor %}
                     </div>
-                    {% else %}
-                    <div class="empty-state">
+                    <div id="noActivity" class="empty-state" {{ 'hidden' if recent_logs else '' }}>
                         <i class="fas fa-inbox"></i>
                         <p>No recent activity</p>
                         <small>Proxy requests will appear here</small>
                     </div>
-                    {% endif %}
                 </div>
             </div>
         </main>
@@ -274,7 +1660,6 @@ class HTTPProxyServer:
                     .then(data => {
                         if (data.success) {
                             showNotification('Cache cleared successfully', 'success');
-                            setTimeout(() => location.reload(), 1000);
                         }
                     });
             }
@@ -286,7 +1671,6 @@ class HTTPProxyServer:
                 .then(data => {
                     if (data.success) {
                         showNotification('Test cache data added successfully', 'success');
-                        setTimeout(() => location.reload(), 1000);
                     }
                 });
         });
@@ -320,7 +1704,6 @@ class HTTPProxyServer:
                     if (data.success) {
                         showNotification('Domain ' + domain + ' blocked successfully', 'success');
                         document.getElementById('newDomain').value = '';
-                        setTimeout(() => location.reload(), 1000);
                     }
                 });
             } else {
@@ -328,44 +1711,104 @@ class HTTPProxyServer:
             }
         });
 
-        document.querySelectorAll('.unblock-btn').forEach(btn => {
-            btn.addEventListener('click', function() {
-                const domain = this.getAttribute('data-domain');
-                if (domain && confirm('Unblock ' + domain + '?')) {
-                    fetch('/api/unblock_domain', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/x-www-form-urlencoded',
-                        },
-                        body: 'domain=' + encodeURIComponent(domain)
-                    })
-                    .then(response => response.json())
-                    .then(data => {
-                        if (data.success) {
-                            showNotification('Domain ' + domain + ' unblocked', 'success');
-                            setTimeout(() => location.reload(), 1000);
-                        }
-                    });
-                }
-            });
-        });
-
-        // Auto-refresh stats
-        setInterval(() => {
-            fetch('/api/stats')
+        // Unblock buttons are re-rendered as the list changes, so listen on the list
+        document.getElementById('domainList').addEventListener('click', function(event) {
+            const btn = event.target.closest('.unblock-btn');
+            if (!btn) return;
+            const domain = btn.getAttribute('data-domain');
+            if (domain && confirm('Unblock ' + domain + '?')) {
+                fetch('/api/unblock_domain', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/x-www-form-urlencoded',
+                    },
+                    body: 'domain=' + encodeURIComponent(domain)
+                })
                 .then(response => response.json())
                 .then(data => {
-                    // Update total requests with animation
-                    const requestElement = document.querySelector('.stat-card.primary .stat-value');
-                    if (requestElement.textContent != data.total_requests) {
-                        requestElement.style.transform = 'scale(1.1)';
-                        setTimeout(() => {
-                            requestElement.textContent = data.total_requests;
-                            requestElement.style.transform = 'scale(1)';
-                        }, 200);
+                    if (data.success) {
+                        showNotification('Domain ' + domain + ' unblocked', 'success');
                     }
                 });
-        }, 3000);
+            }
+        });
+
+        function escapeHtml(value) {
+            const div = document.createElement('div');
+            div.textContent = value ?? '';
+            return div.innerHTML;
+        }
+
+        function setAnimated(element, value) {
+            if (element.textContent == value) return;
+            element.style.transform = 'scale(1.1)';
+            setTimeout(() => {
+                element.textContent = value;
+                element.style.transform = 'scale(1)';
+            }, 200);
+        }
+
+        function methodIcon(method) {
+            return method === 'GET' ? 'download' : method === 'POST' ? 'upload' : 'exchange-alt';
+        }
+
+        // Live updates pushed by the server
+        const events = new EventSource('/api/stream');
+
+        events.addEventListener('stats', event => {
+            const stats = JSON.parse(event.data);
+            if ('total_requests' in stats) setAnimated(document.getElementById('totalRequests'), stats.total_requests);
+            if ('blocked_domains' in stats) setAnimated(document.getElementById('blockedCount'), stats.blocked_domains);
+            if ('cache_enabled' in stats) {
+                document.getElementById('cacheStatus').textContent = stats.cache_enabled ? 'Enabled' : 'Disabled';
+                document.getElementById('cacheToggle').checked = stats.cache_enabled;
+            }
+        });
+
+        events.addEventListener('cache', event => {
+            const cacheStats = JSON.parse(event.data);
+            setAnimated(document.getElementById('cachedItems'), cacheStats.total_cached);
+            document.getElementById('cacheSize').textContent = cacheStats.cache_size_kb;
+        });
+
+        events.addEventListener('blocked_domains', event => {
+            const domains = JSON.parse(event.data);
+            document.getElementById('domainList').innerHTML = domains.map(domain => `
+                <div class="domain-item">
+                    <span class="domain-name">${escapeHtml(domain)}</span>
+                    <button class="btn btn-sm btn-danger unblock-btn" data-domain="${escapeHtml(domain)}">
+                        <i class="fas fa-unlock"></i>
+                    </button>
+                </div>
+            `).join('');
+            document.getElementById('noBlockedDomains').hidden = domains.length > 0;
+        });
+
+        events.addEventListener('logs', event => {
+            // Newest first, like the list
+            const logs = JSON.parse(event.data);
+            const activityList = document.getElementById('activityList');
+            activityList.insertAdjacentHTML('afterbegin', logs.slice(0, 10).map(log => `
+                <div class="activity-item">
+                    <div class="activity-icon ${escapeHtml(log.method.toLowerCase())}">
+                        <i class="fas fa-${methodIcon(log.method)}"></i>
+                    </div>
+                    <div class="activity-content">
+                        <div class="activity-main">
+                            <span class="activity-method ${escapeHtml(log.method.toLowerCase())}">${escapeHtml(log.method)}</span>
+                            <span class="activity-url">${escapeHtml(log.url)}</span>
+                        </div>
+                        <div class="activity-meta">
+                            <span class="activity-time">${escapeHtml(log.timestamp)}</span>
+                            <span class="activity-status status-${Math.floor(log.status_code / 100)}">${log.status_code}</span>
+                            <span class="activity-size">${log.response_size} bytes</span>
+                        </div>
+                    </div>
+                </div>
+            `).join(''));
+            while (activityList.children.length > 10) activityList.lastElementChild.remove();
+            document.getElementById('noActivity').hidden = true;
+        });
 
         // Notification system
         function showNotification(message, type = 'info') {
@@ -464,16 +1907,47 @@ class HTTPProxyServer:
 
             <div class="panel">
                 <div class="panel-header">
-                    <h2><i class="fas fa-history"></i> Recent Requests ({{ logs|length }} total)</h2>
+                    <h2><i class="fas fa-history"></i> Recent Requests (<span id="totalRequests">{{ stats.total_requests }}</span> total)</h2>
                     <div class="panel-actions">
-                        <button class="btn btn-secondary btn-sm" onclick="location.reload()">
+                        <button id="refreshLogsBtn" class="btn btn-secondary btn-sm">
                             <i class="fas fa-sync-alt"></i>
                             Refresh
                         </button>
                     </div>
                 </div>
                 <div class="panel-content">
-                    {% if logs %}
+                    {% if stats.total_requests %}
+                    <form id="logFilters" class="input-group filter-bar">
+                        <select name="window" class="form-input">
+                            <option value="">Any time</option>
+                            <option value="900">Last 15 minutes</option>
+                            <option value="3600">Last hour</option>
+                            <option value="86400">Last 24 hours</option>
+                        </select>
+                        <input type="text" name="host" placeholder="Domain" class="form-input">
+                        <input type="text" name="prefix" placeholder="URL prefix" class="form-input">
+                        <input type="text" name="client_ip" placeholder="Client IP" class="form-input">
+                        <select name="method" class="form-input">
+                            <option value="">All methods</option>
+                            <option>GET</option>
+                            <option>POST</option>
+                            <option>HEAD</option>
+                            <option>PUT</option>
+                            <option>DELETE</option>
+                            <option>CONNECT</option>
+                        </select>
+                        <select name="status" class="form-input">
+                            <option value="">All statuses</option>
+                            <option value="2">2xx</option>
+                            <option value="3">3xx</option>
+                            <option value="4">4xx</option>
+                            <option value="5">5xx</option>
+                        </select>
+                        <button type="submit" class="btn btn-primary">
+                            <i class="fas fa-search"></i>
+                            Search
+                        </button>
+                    </form>
                     <div class="table-container">
                         <table class="data-table">
                             <thead>
@@ -486,29 +1960,15 @@ class HTTPProxyServer:
                                     <th>Size</th>
                                 </tr>
                             </thead>
-                            <tbody>
-                                {% for log in logs %}
-                                <tr>
-                                    <td class="timestamp">{{ log.timestamp }}</td>
-                                    <td class="ip-address">{{ log.client_ip }}</td>
-                                    <td>
-                                        <span class="method-badge {{ log.method.lower() }}">
-                                            <i class="fas fa-{{ 'download' if log.method == 'GET' else 'upload' if log.method == 'POST' else 'exchange-alt' }}"></i>
-                                            {{ log.method }}
-                                        </span>
-                                    </td>
-                                    <td class="url-cell">{{ log.url }}</td>
-                                    <td>
-                                        <span class="status-badge status-{{ log.status_code // 100 }}">
-                                            {{ log.status_code }}
-                                        </span>
-                                    </td>
-                                    <td class="size">{{ log.response_size }} bytes</td>
-                                </tr>
-                                {% endfor %}
-                            </tbody>
+                            <tbody id="logRows"></tbody>
                         </table>
                     </div>
+                    <div id="loadMore" class="load-more">
+                        <button id="loadMoreBtn" class="btn btn-secondary btn-sm">
+                            <i class="fas fa-chevron-down"></i>
+                            Load more
+                        </button>
+                    </div>
                     {% else %}
                     <div class="empty-state">
                         <i class="fas fa-inbox"></i>
@@ -522,61 +1982,255 @@ class HTTPProxyServer:
                     {% endif %}
                 </div>
             </div>
-        </main>
-    </div>
-</body>
-</html>'''
-        
-        # Create cache.html
-        cache_html = '''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Cache Manager - Proxy Server</title>
-    <link rel="stylesheet" href="{{ url_for('static', filename='style.css') }}">
-    <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-</head>
-<body>
-    <div class="app-container">
-        <nav class="sidebar">
-            <div class="sidebar-header">
-                <div class="logo">
-                    <i class="fas fa-shield-alt"></i>
-                    <span>HTTP Web Proxy Server</span>
-                </div>
-            </div>
-            <ul class="sidebar-nav">
-                <li class="nav-item">
-                    <a href="{{ url_for('index') }}" class="nav-link">
-                        <i class="fas fa-tachometer-alt"></i>
-                        <span>Dashboard</span>
-                    </a>
-                </li>
-                <li class="nav-item">
-                    <a href="{{ url_for('logs') }}" class="nav-link">
-                        <i class="fas fa-list-alt"></i>
-                        <span>Request Logs</span>
-                    </a>
-                </li>
-                <li class="nav-item active">
-                    <a href="{{ url_for('cache_view') }}" class="nav-link">
-                        <i class="fas fa-database"></i>
-                        <span>Cache Manager</span>
-                    </a>
-                </li>
-            </ul>
-        </nav>
 
-        <main class="main-content">
-            <header class="content-header">
-                <div class="header-left">
-                    <h1>Cache Manager</h1>
-                    <p class="subtitle">Manage and monitor cached responses</p>
+            {% if stats.total_requests %}
+            <!-- Top Talkers -->
+            <div class="panel">
+                <div class="panel-header">
+                    <h2><i class="fas fa-chart-bar"></i> Top Talkers</h2>
+                    <div class="panel-actions">
+                        <select id="topBy" class="form-input">
+                            <option value="client_ip">By client IP</option>
+                            <option value="host">By domain</option>
+                            <option value="status_code">By status</option>
+                            <option value="method">By method</option>
+                        </select>
+                    </div>
                 </div>
-                <div class="header-actions">
-                    <a href="{{ url_for('index') }}" class="btn btn-secondary">
-                        <i class="fas fa-arrow-left"></i>
+                <div class="panel-content">
+                    <div class="table-container">
+                        <table class="data-table">
+                            <thead>
+                                <tr>
+                                    <th id="topByHeader">Client IP</th>
+                                    <th>Requests</th>
+                                    <th>Size</th>
+                                </tr>
+                            </thead>
+                            <tbody id="topRows"></tbody>
+                        </table>
+                    </div>
+                </div>
+            </div>
+            {% endif %}
+        </main>
+    </div>
+
+    <script>
+        // Logs are fetched a page at a time as the list is scrolled
+        const logRows = document.getElementById('logRows');
+        const loadMore = document.getElementById('loadMore');
+        const filters = document.getElementById('logFilters');
+        const topBy = document.getElementById('topBy');
+        let nextCursor = null;
+        let newestId = 0;
+        let loading = false;
+
+        function escapeHtml(value) {
+            const div = document.createElement('div');
+            div.textContent = value ?? '';
+            return div.innerHTML;
+        }
+
+        function filterParams() {
+            const form = new FormData(filters);
+            const params = new URLSearchParams();
+            for (const name of ['host', 'prefix', 'client_ip', 'method']) {
+                if (form.get(name)) params.set(name, form.get(name));
+            }
+            if (form.get('window')) {
+                params.set('since', Math.floor(Date.now() / 1000) - Number(form.get('window')));
+            }
+            if (form.get('status')) {
+                params.set('status_min', form.get('status') * 100);
+                params.set('status_max', form.get('status') * 100 + 99);
+            }
+            return params;
+        }
+
+        function methodIcon(method) {
+            return method === 'GET' ? 'download' : method === 'POST' ? 'upload' : 'exchange-alt';
+        }
+
+        function logRow(log) {
+            return `
+                <tr>
+                    <td class="timestamp">${escapeHtml(log.timestamp)}</td>
+                    <td class="ip-address">${escapeHtml(log.client_ip)}</td>
+                    <td>
+                        <span class="method-badge ${escapeHtml(log.method.toLowerCase())}">
+                            <i class="fas fa-${methodIcon(log.method)}"></i>
+                            ${escapeHtml(log.method)}
+                        </span>
+                    </td>
+                    <td class="url-cell" title="${escapeHtml(log.url)}">${escapeHtml(log.url)}</td>
+                    <td>
+                        <span class="status-badge status-${Math.floor(log.status_code / 100)}">
+                            ${log.status_code}
+                        </span>
+                    </td>
+                    <td class="size">${log.response_size} bytes</td>
+                </tr>
+            `;
+        }
+
+        function loadLogs(reset = false) {
+            if (!logRows || loading || (!reset && !nextCursor)) return;
+            loading = true;
+            const params = filterParams();
+            if (!reset) params.set('cursor', nextCursor);
+            fetch('/api/logs?' + params)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.error) {
+                        showNotification(data.error, 'error');
+                        return;
+                    }
+                    if (reset) {
+                        logRows.innerHTML = '';
+                        newestId = data.items.length ? data.items[0].id : newestId;
+                    }
+                    logRows.insertAdjacentHTML('beforeend', data.items.map(logRow).join(''));
+                    nextCursor = data.next_cursor;
+                    loadMore.style.display = nextCursor ? '' : 'none';
+                })
+                .finally(() => { loading = false; });
+        }
+
+        function loadTopTalkers() {
+            if (!topBy) return;
+            const params = filterParams();
+            params.set('by', topBy.value);
+            fetch('/api/logs/top?' + params)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.error) return;
+                    document.getElementById('topByHeader').textContent = topBy.options[topBy.selectedIndex].text.replace('By ', '');
+                    document.getElementById('topRows').innerHTML = data.map(row => `
+                        <tr>
+                            <td>${escapeHtml(String(row[topBy.value]))}</td>
+                            <td>${row.requests}</td>
+                            <td class="size">${row.bytes} bytes</td>
+                        </tr>
+                    `).join('');
+                });
+        }
+
+        if (logRows) {
+            filters.addEventListener('submit', function(event) {
+                event.preventDefault();
+                loadLogs(true);
+                loadTopTalkers();
+            });
+            topBy.addEventListener('change', loadTopTalkers);
+            document.getElementById('loadMoreBtn').addEventListener('click', () => loadLogs());
+            new IntersectionObserver(entries => {
+                if (entries[0].isIntersecting) loadLogs();
+            }).observe(loadMore);
+            loadLogs(true);
+            loadTopTalkers();
+        }
+        // Live updates pushed by the server
+        const events = new EventSource('/api/stream');
+
+        events.addEventListener('stats', event => {
+            const stats = JSON.parse(event.data);
+            if (!('total_requests' in stats)) return;
+            document.getElementById('totalRequests').textContent = stats.total_requests;
+            if (!logRows && stats.total_requests > 0) location.reload();
+        });
+
+        events.addEventListener('logs', event => {
+            // Only an unfiltered list can take new entries as they are
+            if (!logRows || [...new FormData(filters).values()].some(value => value)) return;
+            const logs = JSON.parse(event.data).filter(log => log.id > newestId);
+            if (!logs.length) return;
+            newestId = logs[0].id;
+            logRows.insertAdjacentHTML('afterbegin', logs.map(logRow).join(''));
+        });
+
+        document.getElementById('refreshLogsBtn').addEventListener('click', () => {
+            if (logRows) {
+                loadLogs(true);
+                loadTopTalkers();
+            } else {
+                location.reload();
+            }
+        });
+
+        // Notification system
+        function showNotification(message, type = 'info') {
+            const notification = document.createElement('div');
+            notification.className = `notification notification-${type}`;
+            notification.innerHTML = `
+                <i class="fas fa-${type === 'success' ? 'check' : type === 'error' ? 'exclamation' : 'info'}-circle"></i>
+                <span>${message}</span>
+                <button onclick="this.parentElement.remove()">
+                    <i class="fas fa-times"></i>
+                </button>
+            `;
+            
+            document.body.appendChild(notification);
+            setTimeout(() => notification.classList.add('show'), 100);
+            setTimeout(() => {
+                notification.classList.remove('show');
+                setTimeout(() => notification.remove(), 300);
+            }, 4000);
+        }
+    </script>
+</body>
+</html>'''
+        
+        # Create cache.html
+        cache_html = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Cache Manager - Proxy Server</title>
+    <link rel="stylesheet" href="{{ url_for('static', filename='style.css') }}">
+    <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
+</head>
+<body>
+    <div class="app-container">
+        <nav class="sidebar">
+            <div class="sidebar-header">
+                <div class="logo">
+                    <i class="fas fa-shield-alt"></i>
+                    <span>HTTP Web Proxy Server</span>
+                </div>
+            </div>
+            <ul class="sidebar-nav">
+                <li class="nav-item">
+                    <a href="{{ url_for('index') }}" class="nav-link">
+                        <i class="fas fa-tachometer-alt"></i>
+                        <span>Dashboard</span>
+                    </a>
+                </li>
+                <li class="nav-item">
+                    <a href="{{ url_for('logs') }}" class="nav-link">
+                        <i class="fas fa-list-alt"></i>
+                        <span>Request Logs</span>
+                    </a>
+                </li>
+                <li class="nav-item active">
+                    <a href="{{ url_for('cache_view') }}" class="nav-link">
+                        <i class="fas fa-database"></i>
+                        <span>Cache Manager</span>
+                    </a>
+                </li>
+            </ul>
+        </nav>
+
+        <main class="main-content">
+            <header class="content-header">
+                <div class="header-left">
+                    <h1>Cache Manager</h1>
+                    <p class="subtitle">Manage and monitor cached responses</p>
+                </div>
+                <div class="header-actions">
+                    <a href="{{ url_for('index') }}" class="btn btn-secondary">
+                        <i class="fas fa-arrow-left"></i>
                         Back to Dashboard
                     </a>
                 </div>
@@ -590,7 +2244,7 @@ class HTTPProxyServer:
                     </div>
                     <div class="stat-content">
                         <h3>Total Items</h3>
-                        <div class="stat-value">{{ cache_stats.total_cached }}</div>
+                        <div id="totalCached" class="stat-value">{{ cache_stats.total_cached }}</div>
                     </div>
                 </div>
 
@@ -600,7 +2254,7 @@ class HTTPProxyServer:
                     </div>
                     <div class="stat-content">
                         <h3>Total Size</h3>
-                        <div class="stat-value">{{ cache_stats.cache_size_kb }}</div>
+                        <div id="cacheSize" class="stat-value">{{ cache_stats.cache_size_kb }}</div>
                         <div class="stat-subtext">kB</div>
                     </div>
                 </div>
@@ -611,7 +2265,7 @@ class HTTPProxyServer:
                     </div>
                     <div class="stat-content">
                         <h3>Content Types</h3>
-                        <div class="stat-value">{{ cache_stats.cache_by_type|length }}</div>
+                        <div id="typeCount" class="stat-value">{{ cache_stats.cache_by_type|length }}</div>
                         <div class="stat-subtext">Different types</div>
                     </div>
                 </div>
@@ -646,7 +2300,7 @@ class HTTPProxyServer:
                         <h2><i class="fas fa-chart-pie"></i> Content Types</h2>
                     </div>
                     <div class="panel-content">
-                        <div class="type-list">
+                        <div id="typeList" class="type-list">
                             {% for item in cache_stats.cache_by_type %}
                             <div class="type-item">
                                 <div class="type-info">
@@ -665,16 +2319,35 @@ class HTTPProxyServer:
             <!-- Cached Items -->
             <div class="panel cached-items">
                 <div class="panel-header">
-                    <h2><i class="fas fa-database"></i> Cached Items ({{ cached_items|length }} total)</h2>
+                    <h2><i class="fas fa-database"></i> Cached Items (<span id="totalCachedItems">{{ cache_stats.total_cached }}</span> total)</h2>
                     <div class="panel-actions">
-                        <button class="btn btn-secondary btn-sm" onclick="location.reload()">
+                        <button id="refreshItemsBtn" class="btn btn-secondary btn-sm">
                             <i class="fas fa-sync-alt"></i>
                             Refresh
                         </button>
                     </div>
                 </div>
                 <div class="panel-content">
-                    {% if cached_items %}
+                    {% if cache_stats.total_cached %}
+                    <form id="cacheFilters" class="input-group filter-bar">
+                        <input type="text" name="prefix" placeholder="URL prefix (e.g., http://example.com/static/)" class="form-input">
+                        <input type="text" name="domain" placeholder="Domain" class="form-input">
+                        <select name="content_type" class="form-input">
+                            <option value="">All content types</option>
+                            {% for item in cache_stats.cache_by_type %}
+                            <option value="{{ item.content_type }}">{{ item.content_type }}</option>
+                            {% endfor %}
+                        </select>
+                        <select name="sort" class="form-input">
+                            <option value="timestamp">Newest first</option>
+                            <option value="size">Largest first</option>
+                            <option value="hits">Most hits first</option>
+                        </select>
+                        <button type="submit" class="btn btn-primary">
+                            <i class="fas fa-search"></i>
+                            Search
+                        </button>
+                    </form>
                     <div class="table-container">
                         <table class="data-table">
                             <thead>
@@ -683,22 +2356,18 @@ class HTTPProxyServer:
                                     <th>Content Type</th>
                                     <th>Cached At</th>
                                     <th>Size</th>
+                                    <th>Hits</th>
                                 </tr>
                             </thead>
-                            <tbody>
-                                {% for item in cached_items %}
-                                <tr>
-                                    <td class="url-cell">{{ item.url }}</td>
-                                    <td>
-                                        <span class="content-type-badge">{{ item.content_type }}</span>
-                                    </td>
-                                    <td class="timestamp">{{ item.timestamp }}</td>
-                                    <td class="size">{{ item.size }} bytes</td>
-                                </tr>
-                                {% endfor %}
-                            </tbody>
+                            <tbody id="cachedItems"></tbody>
                         </table>
                     </div>
+                    <div id="loadMore" class="load-more">
+                        <button id="loadMoreBtn" class="btn btn-secondary btn-sm">
+                            <i class="fas fa-chevron-down"></i>
+                            Load more
+                        </button>
+                    </div>
                     {% else %}
                     <div class="empty-state">
                         <i class="fas fa-database"></i>
@@ -722,6 +2391,95 @@ class HTTPProxyServer:
     </div>
 
     <script>
+        // Cached items are fetched a page at a time as the list is scrolled
+        const cachedItems = document.getElementById('cachedItems');
+        const loadMore = document.getElementById('loadMore');
+        const filters = document.getElementById('cacheFilters');
+        let nextCursor = null;
+        let loading = false;
+
+        function escapeHtml(value) {
+            const div = document.createElement('div');
+            div.textContent = value ?? '';
+            return div.innerHTML;
+        }
+
+        function loadCachedItems(reset = false) {
+            if (!cachedItems || loading || (!reset && !nextCursor)) return;
+            loading = true;
+            const params = new URLSearchParams(new FormData(filters));
+            params.set('order', 'desc');
+            if (!reset) params.set('cursor', nextCursor);
+            fetch('/api/cache?' + params)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.error) {
+                        showNotification(data.error, 'error');
+                        return;
+                    }
+                    if (reset) cachedItems.innerHTML = '';
+                    cachedItems.insertAdjacentHTML('beforeend', data.items.map(item => `
+                        <tr>
+                            <td class="url-cell" title="${escapeHtml(item.url)}">${escapeHtml(item.url)}</td>
+                            <td>
+                                <span class="content-type-badge">${escapeHtml(item.content_type)}</span>
+                            </td>
+                            <td class="timestamp">${escapeHtml(item.timestamp)}</td>
+                            <td class="size">${item.size} bytes</td>
+                            <td>${item.hits}</td>
+                        </tr>
+                    `).join(''));
+                    nextCursor = data.next_cursor;
+                    loadMore.style.display = nextCursor ? '' : 'none';
+                })
+                .finally(() => { loading = false; });
+        }
+
+        if (cachedItems) {
+            filters.addEventListener('submit', function(event) {
+                event.preventDefault();
+                loadCachedItems(true);
+            });
+            document.getElementById('loadMoreBtn').addEventListener('click', () => loadCachedItems());
+            new IntersectionObserver(entries => {
+                if (entries[0].isIntersecting) loadCachedItems();
+            }).observe(loadMore);
+            loadCachedItems(true);
+        }
+        document.getElementById('refreshItemsBtn').addEventListener('click', () => {
+            if (cachedItems) loadCachedItems(true); else location.reload();
+        });
+
+        // Live updates pushed by the server
+        const events = new EventSource('/api/stream');
+
+        events.addEventListener('cache', event => {
+            const cacheStats = JSON.parse(event.data);
+            // The empty page has no list to fill, render it again once there is something to show
+            if (!cachedItems && cacheStats.total_cached > 0) location.reload();
+            document.getElementById('totalCached').textContent = cacheStats.total_cached;
+            document.getElementById('cacheSize').textContent = cacheStats.cache_size_kb;
+            document.getElementById('typeCount').textContent = cacheStats.cache_by_type.length;
+            const totalCachedItems = document.getElementById('totalCachedItems');
+            if (totalCachedItems) totalCachedItems.textContent = cacheStats.total_cached;
+            const typeList = document.getElementById('typeList');
+            if (typeList) {
+                typeList.innerHTML = cacheStats.cache_by_type.map(item => `
+                    <div class="type-item">
+                        <div class="type-info">
+                            <span class="type-name">${escapeHtml(item.content_type)}</span>
+                            <span class="type-count">${item.count} items</span>
+                        </div>
+                        <div class="type-size">${item.size} bytes</div>
+                    </div>
+                `).join('');
+            }
+        });
+
+        events.addEventListener('cache_cleared', () => {
+            if (cachedItems) loadCachedItems(true);
+        });
+
         // Cache actions
         document.getElementById('clearCacheBtn')?.addEventListener('click', function() {
             if (confirm('Are you sure you want to clear all cached data? This action cannot be undone.')) {
@@ -730,7 +2488,6 @@ class HTTPProxyServer:
                     .then(data => {
                         if (data.success) {
                             showNotification('Cache cleared successfully', 'success');
-                            setTimeout(() => location.reload(), 1000);
                         }
                     });
             }
@@ -742,7 +2499,7 @@ class HTTPProxyServer:
                 .then(data => {
                     if (data.success) {
                         showNotification('Test cache data added successfully', 'success');
-                        setTimeout(() => location.reload(), 1000);
+                        if (cachedItems) loadCachedItems(true);
                     }
                 });
         };
@@ -1436,6 +3193,17 @@ body {
     white-space: nowrap;
 }
 
+.filter-bar {
+    flex-wrap: wrap;
+    margin-bottom: 1rem;
+}
+
+.load-more {
+    display: flex;
+    justify-content: center;
+    padding-top: 1rem;
+}
+
 /* Empty States */
 .empty-state {
     text-align: center;
@@ -1696,21 +3464,58 @@ body {
     
     def init_database(self):
         """Initialize SQLite database for logs and cache"""
-        self.conn = sqlite3.connect('proxy.db', check_same_thread=False)
-        cursor = self.conn.cursor()
+        self.db = Database('proxy.db', self.sqlite_synchronous, self.sqlite_readers)
+        self.blocked_domains = self.db.write(self.create_tables)
+        
+        # The only full counts, from here on the counters are maintained as rows come and go
+        seed = {'requests': self.db.fetchone("SELECT COUNT(*) FROM request_logs")[0]}
+        for content_type, count, size in self.db.fetchall(
+                "SELECT content_type, COUNT(*), COALESCE(SUM(size), 0) FROM cache GROUP BY content_type"):
+            for name, value in cache_metrics(content_type, count, size).items():
+                seed[name] = seed.get(name, 0) + value
+        self.metrics.seed(seed)
+    
+    def create_tables(self, conn):
+        """Create or migrate the tables (writer thread), returns the blocked domains"""
+        cursor = conn.cursor()
         
-        # Create logs table
+        # Let eviction hand free pages back to the filesystem a few at a time
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+        
+        # Create logs table, timestamps are epoch seconds
+        conn.create_function('url_host', 1, url_host)
+        cursor.execute("PRAGMA table_info(request_logs)")
+        if any(row[1] == 'timestamp' and row[2] == 'TEXT' for row in cursor.fetchall()):
+            # Older versions stored local time text, rebuild the table once with epoch seconds
+            cursor.execute("ALTER TABLE request_logs RENAME TO request_logs_text")
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS request_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
+                timestamp INTEGER,
                 client_ip TEXT,
                 method TEXT,
                 url TEXT,
                 status_code INTEGER,
-                response_size INTEGER
+                response_size INTEGER,
+                host TEXT
             )
         ''')
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'request_logs_text'")
+        if cursor.fetchone():
+            cursor.execute('''
+                INSERT INTO request_logs (id, timestamp, client_ip, method, url, status_code, response_size, host)
+                SELECT id, CAST(strftime('%s', timestamp, 'utc') AS INTEGER), client_ip, method, url, status_code,
+                       response_size, url_host(url)
+                FROM request_logs_text
+            ''')
+            cursor.execute("DROP TABLE request_logs_text")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_request_logs_timestamp ON request_logs (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_request_logs_client_ip ON request_logs (client_ip)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_request_logs_host ON request_logs (host)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_request_logs_status_code ON request_logs (status_code)")
         
         # Create cache table
         cursor.execute('''
@@ -1718,9 +3523,46 @@ body {
                 url TEXT PRIMARY KEY,
                 response_data BLOB,
                 timestamp TEXT,
-                content_type TEXT
+                content_type TEXT,
+                expires REAL,
+                size INTEGER,
+                last_access REAL,
+                hits INTEGER DEFAULT 0,
+                base_key TEXT,
+                vary TEXT,
+                blob TEXT,
+                encodings TEXT DEFAULT '',
+                host TEXT
+            )
+        ''')
+        ensure_columns(cursor, 'cache', {'expires': 'REAL', 'size': 'INTEGER', 'last_access': 'REAL', 'hits': 'INTEGER DEFAULT 0',
+                                         'base_key': 'TEXT', 'vary': 'TEXT', 'blob': 'TEXT', 'encodings': "TEXT DEFAULT ''",
+                                         'host': 'TEXT'})
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_blob ON cache (blob)")
+        
+        # Compressed variants of cache entries, their sizes are included in the entry's size
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cache_encodings (
+                url TEXT,
+                encoding TEXT,
+                response_data BLOB,
+                blob TEXT,
+                size INTEGER,
+                PRIMARY KEY (url, encoding)
             )
         ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_encodings_blob ON cache_encodings (blob)")
+        cursor.execute("UPDATE cache SET base_key = url, vary = '' WHERE base_key IS NULL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_base_key ON cache (base_key)")
+        cursor.execute("UPDATE cache SET size = LENGTH(response_data) WHERE size IS NULL")
+        cursor.execute("UPDATE cache SET last_access = timestamp WHERE last_access IS NULL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache (last_access)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_hits ON cache (hits, last_access)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_content_type ON cache (content_type)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_timestamp ON cache (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_size ON cache (size)")
+        cursor.execute("UPDATE cache SET host = url_host(url) WHERE host IS NULL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cache_host ON cache (host)")
         
         # Create blocked domains table
         cursor.execute('''
@@ -1731,18 +3573,16 @@ body {
         
         # Load blocked domains from database
         cursor.execute("SELECT domain FROM blocked_domains")
-        self.blocked_domains = set(row[0] for row in cursor.fetchall())
-        
-        self.conn.commit()
+        return set(row[0] for row in cursor.fetchall())
     
     def start_server(self):
         """Start the proxy server"""
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.processes > 1:
+            self.start_supervisor()
+            return
         
         try:
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            self.open_server_socket()
             self.is_running = True
             print(f"Proxy server started on {self.host}:{self.port}")
             print(f"Web interface available at http://localhost:5000")
@@ -1752,181 +3592,1540 @@ body {
             web_interface_thread = threading.Thread(target=self.start_web_interface, daemon=True)
             web_interface_thread.start()
             
-            while self.is_running:
-                try:
-                    client_socket, client_address = self.server_socket.accept()
-                    client_thread = threading.Thread(
-                        target=self.handle_client, 
-                        args=(client_socket, client_address)
-                    )
-                    client_thread.daemon = True
-                    client_thread.start()
-                except OSError:
-                    # Socket closed, break the loop
-                    break
+            threading.Thread(target=self.cache_maintenance_loop, daemon=True).start()
+            self.start_log_writer()
+            self.start_compressors()
+            self.start_refreshers()
+            self.serve_forever()
                     
         except Exception as e:
             print(f"Error starting server: {e}")
     
+    def open_server_socket(self, reuse_port=False):
+        """Create, bind and listen on the proxy socket"""
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            # Every worker process binds the same port, the kernel balances connections between them
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(self.backlog)
+    
+    def serve_forever(self):
+        """Accept and handle client connections until the server is stopped"""
+        if self.engine == 'asyncio':
+            asyncio.run(self.serve_async())
+            return
+        
+        self.start_workers()
+        
+        while self.is_running:
+            try:
+                client_socket, client_address = self.server_socket.accept()
+                try:
+                    self.work_queue.put_nowait((client_socket, client_address, time.time()))
+                except queue.Full:
+                    # Shed load instead of letting latency collapse for everyone
+                    with self.pool_lock:
+                        self.pool_stats['rejected'] += 1
+                    self.reject_client(client_socket)
+            except OSError:
+                # Socket closed, break the loop
+                break
+    
     def stop_server(self):
         """Stop the proxy server"""
         self.is_running = False
-        if self.server_socket:
+        if self.loop:
+            # The event loop owns the listening socket, let it shut down itself
+            self.loop.call_soon_threadsafe(self.async_stop_event.set)
+        elif self.server_socket:
             self.server_socket.close()
-        if self.conn:
-            self.conn.close()
+        for _ in self.workers:
+            self.work_queue.put(None)
+        self.workers = []
+        self.stop_worker_processes()
+        self.upstream_pool.close_all()
+        self.tunnel_relay.stop()
+        self.stop_log_writer()
+        self.stop_compressors()
+        self.stop_refreshers()
+        if self.db:
+            self.db.close()
         print("Proxy server stopped")
     
-    def handle_client(self, client_socket, client_address):
-        """Handle client connection"""
-        try:
-            # Receive request from client
-            request_data = client_socket.recv(4096)
-            if not request_data:
-                return
-            
-            # Parse the request
-            request_lines = request_data.decode('utf-8', errors='ignore').split('\r\n')
-            if not request_lines or not request_lines[0]:
-                return
-            
-            # Parse request line
-            request_parts = request_lines[0].split(' ')
-            if len(request_parts) < 2:
-                return
-            
-            method = request_parts[0]
-            url = request_parts[1]
-            
-            # Extract host and port from request headers
-            host = None
-            port = 80
-            
-            for line in request_lines[1:]:
-                if line.lower().startswith('host:'):
-                    host_part = line.split(':', 1)[1].strip()
-                    if ':' in host_part:
-                        host, port_str = host_part.split(':', 1)
-                        port = int(port_str)
-                    else:
-                        host = host_part
+    def start_supervisor(self):
+        """Run N worker processes on the same port and keep them alive"""
+        context = multiprocessing.get_context('spawn')
+        self.stats_queue = context.Queue()
+        self.is_running = True
+        
+        for index in range(self.processes):
+            self.spawn_worker_process(context, index)
+        
+        print(f"Proxy server started on {self.host}:{self.port} with {self.processes} worker processes")
+        print(f"Web interface available at http://localhost:5000")
+        print(f"Configure your browser to use proxy: {self.host}:{self.port}")
+        
+        threading.Thread(target=self.collect_worker_stats_loop, daemon=True).start()
+        threading.Thread(target=self.start_web_interface, daemon=True).start()
+        threading.Thread(target=self.cache_maintenance_loop, daemon=True).start()
+        
+        while self.is_running:
+            time.sleep(1)
+            for index, (process, control_queue) in list(self.worker_processes.items()):
+                if not process.is_alive() and self.is_running:
+                    print(f"Worker {index} (pid {process.pid}) exited with code {process.exitcode}, restarting")
+                    # Keep what the worker counted, its replacement starts from zero
+                    for name, amount in self.process_stats.pop(index, {}).get('metrics', {}).items():
+                        self.metrics.add(name, amount)
+                    self.spawn_worker_process(context, index)
+    
+    def spawn_worker_process(self, context, index):
+        """Start (or restart) worker process number index"""
+        control_queue = context.Queue()
+        process = context.Process(
+            target=run_worker_process,
+            args=(self.options, index, self.stats_queue, control_queue),
+            name=f"proxy-process-{index}",
+            daemon=True
+        )
+        process.start()
+        self.worker_processes[index] = (process, control_queue)
+        
+        # Bring the new worker up to date with settings changed since startup
+        control_queue.put(('blocked_domains', list(self.blocked_domains)))
+        control_queue.put(('cache_enabled', self.cache_enabled))
+    
+    def stop_worker_processes(self):
+        """Terminate all worker processes"""
+        for process, control_queue in self.worker_processes.values():
+            process.terminate()
+        for process, control_queue in self.worker_processes.values():
+            process.join(timeout=5)
+        self.worker_processes = {}
+    
+    def broadcast_to_workers(self, command, value):
+        """Send a settings change to every worker process"""
+        for process, control_queue in self.worker_processes.values():
+            control_queue.put((command, value))
+    
+    def collect_worker_stats_loop(self):
+        """Receive periodic statistics reports from worker processes"""
+        while self.is_running:
+            try:
+                index, stats = self.stats_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            self.process_stats[index] = stats
+    
+    def serve_worker_process(self, index, stats_queue, control_queue):
+        """Run the request path inside a worker process"""
+        threading.Thread(
+            target=self.worker_process_sync_loop,
+            args=(index, stats_queue, control_queue),
+            daemon=True
+        ).start()
+        
+        self.open_server_socket(reuse_port=True)
+        self.is_running = True
+        # The supervisor evicts, workers only report which entries they served
+        threading.Thread(target=self.cache_maintenance_loop, args=(False,), daemon=True).start()
+        self.start_log_writer()
+        self.start_compressors()
+        self.start_refreshers()
+        print(f"Worker {index} (pid {os.getpid()}) listening on {self.host}:{self.port}")
+        self.serve_forever()
+    
+    def worker_process_sync_loop(self, index, stats_queue, control_queue, interval=1.0):
+        """Apply settings from the supervisor and report statistics back"""
+        while True:
+            deadline = time.time() + interval
+            while True:
+                try:
+                    command, value = control_queue.get(timeout=max(0, deadline - time.time()))
+                except queue.Empty:
                     break
+                if command == 'blocked_domains':
+                    self.blocked_domains = set(value)
+                elif command == 'cache_enabled':
+                    self.cache_enabled = value
+                elif command == 'clear_memory_cache':
+                    self.cache.clear()
+                    self.vary_index.clear()
+                elif command == 'forget_cache_entries':
+                    for url in value:
+                        self.forget_cache_entry(url)
             
-            if not host:
-                # Try to extract from URL
-                if url.startswith('http://') or url.startswith('https://'):
-                    parsed_url = urlparse(url)
-                    if parsed_url.hostname:
-                        host = parsed_url.hostname
-                        port = parsed_url.port or (80 if parsed_url.scheme == 'http' else 443)
+            stats_queue.put((index, self.collect_worker_stats()))
+    
+    def collect_worker_stats(self):
+        """Snapshot of this process's in-memory statistics"""
+        return {
+            'pid': os.getpid(),
+            'worker_pool': self.get_pool_stats(),
+            'upstream_pool': self.get_upstream_pool_stats(),
+            'cache_tiers': self.get_cache_tier_stats(),
+            'coalescing': self.get_coalescing_stats(),
+            'logging': self.get_log_stats(),
+            'metrics': self.metrics.snapshot()
+        }
+    
+    def parse_request(self, request_data):
+        """Parse method, URL and target host/port from raw request data"""
+        request_lines = request_data.decode('utf-8', errors='ignore').split('\r\n')
+        if not request_lines or not request_lines[0]:
+            return None
+        
+        # Parse request line
+        request_parts = request_lines[0].split(' ')
+        if len(request_parts) < 2:
+            return None
+        
+        method = request_parts[0]
+        url = request_parts[1]
+        
+        if method == 'CONNECT':
+            # The request target is the authority of the tunnel endpoint
+            host, _, port_str = url.rpartition(':')
+            if not host or not port_str.isdigit():
+                return None
+            return method, url, host.strip('[]'), int(port_str)
+        
+        # Extract host and port from request headers
+        host = None
+        port = 80
+        
+        for line in request_lines[1:]:
+            if line.lower().startswith('host:'):
+                host_part = line.split(':', 1)[1].strip()
+                if ':' in host_part:
+                    host, port_str = host_part.split(':', 1)
+                    port = int(port_str)
                 else:
-                    # Assume it's a hostname
-                    host = url.split('/')[0] if '/' in url else url
-                    port = 80
-            
-            if not host:
-                print("Could not determine host from request")
-                return
-            
-            # Check if domain is blocked
-            if host in self.blocked_domains:
-                self.send_blocked_response(client_socket, host)
-                self.log_request(client_address[0], method, url, 403, 0)
-                return
+                    host = host_part
+                break
+        
+        if not host:
+            # Try to extract from URL
+            if url.startswith('http://') or url.startswith('https://'):
+                parsed_url = urlparse(url)
+                if parsed_url.hostname:
+                    host = parsed_url.hostname
+                    port = parsed_url.port or (80 if parsed_url.scheme == 'http' else 443)
+            else:
+                # Assume it's a hostname
+                host = url.split('/')[0] if '/' in url else url
+                port = 80
+        
+        if not host:
+            print("Could not determine host from request")
+            return None
+        
+        return method, url, host, port
+    
+    def start_workers(self):
+        """Start the fixed pool of client worker threads"""
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self.worker_loop, name=f"proxy-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+    
+    def worker_loop(self):
+        """Take accepted connections off the queue and handle them"""
+        while True:
+            item = self.work_queue.get()
+            if item is None:
+                break
+            client_socket, client_address, queued_at = item
             
-            # Check cache for GET requests
-            if method == 'GET' and self.cache_enabled:
-                cached_response = self.get_cached_response(url)
-                if cached_response:
-                    print(f"Cache HIT: {url}")
-                    client_socket.sendall(cached_response)
-                    self.log_request(client_address[0], method, url, 200, len(cached_response))
-                    return
-                else:
-                    print(f"Cache MISS: {url}")
+            queue_wait = time.time() - queued_at
+            with self.pool_lock:
+                self.pool_stats['handled'] += 1
+                self.pool_stats['total_queue_wait'] += queue_wait
+                self.pool_stats['max_queue_wait'] = max(self.pool_stats['max_queue_wait'], queue_wait)
             
-            # Forward request to destination server with better error handling
+            self.handle_client(client_socket, client_address)
+    
+    def reject_client(self, client_socket):
+        """Turn away a connection when the worker queue is full"""
+        try:
+            # Drain whatever request bytes already arrived so close() doesn't reset the connection
+            client_socket.setblocking(False)
             try:
-                # Create socket with shorter timeout for faster failure
-                server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                server_socket.settimeout(5)  # Reduced timeout from 10 to 5 seconds
-                
-                print(f"Attempting to connect to {host}:{port}")
-                server_socket.connect((host, port))
-                print(f"Connected to {host}:{port}")
-                
-                # Send the original request
-                server_socket.sendall(request_data)
-                
-                # Receive response from server
-                response_data = b''
-                server_socket.settimeout(10)  # Longer timeout for receiving data
-                
-                while True:
-                    try:
-                        chunk = server_socket.recv(4096)
-                        if not chunk:
-                            break
-                        response_data += chunk
-                    except socket.timeout:
-                        # No more data to receive
-                        break
-                
-                server_socket.close()
-                
-                if response_data:
-                    # Cache the response if it's cacheable (GET requests with status 200)
-                    if method == 'GET' and self.cache_enabled:
-                        status_code = self.extract_status_code(response_data)
-                        if status_code == 200:
-                            print(f"Caching response for: {url}")
-                            self.cache_response(url, response_data)
-                    
-                    # Send response back to client
-                    client_socket.sendall(response_data)
-                    
-                    # Log the request
-                    status_code = self.extract_status_code(response_data)
-                    self.log_request(client_address[0], method, url, status_code, len(response_data))
-                else:
-                    self.send_error_response(client_socket, 502, "Empty Response from Server")
-                    self.log_request(client_address[0], method, url, 502, 0)
-                
-            except socket.timeout:
-                print(f"Connection timeout to {host}:{port}")
-                self.send_error_response(client_socket, 504, "Gateway Timeout")
-                self.log_request(client_address[0], method, url, 504, 0)
-            except ConnectionRefusedError:
-                print(f"Connection refused by {host}:{port}")
-                self.send_error_response(client_socket, 502, "Connection Refused")
-                self.log_request(client_address[0], method, url, 502, 0)
-            except Exception as e:
-                print(f"Error forwarding request to {host}:{port}: {e}")
-                self.send_error_response(client_socket, 502, "Bad Gateway")
-                self.log_request(client_address[0], method, url, 502, 0)
-        
-        except Exception as e:
-            print(f"Error handling client: {e}")
+                client_socket.recv(65536)
+            except BlockingIOError:
+                pass
+            client_socket.setblocking(True)
+            self.send_error_response(client_socket, 503, "Service Unavailable")
+        except OSError:
+            pass
         finally:
             client_socket.close()
     
-    def add_test_cache_data(self):
-        """Add test cache data for demonstration"""
-        test_responses = {
-            "http://example.com/test1": {
-                "content": b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n<html><body><h1>Test Page 1</h1></body></html>",
-                "content_type": "text/html"
-            },
-            "http://example.com/test2": {
-                "content": b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{\"message\": \"Test JSON data\", \"status\": \"success\"}",
-                "content_type": "application/json"
-            },
+    def get_pool_stats(self):
+        """Get worker pool and queue statistics"""
+        if self.process_stats:
+            return self.aggregate_pool_stats([stats['worker_pool'] for stats in self.process_stats.values()])
+        
+        with self.pool_lock:
+            handled = self.pool_stats['handled']
+            return {
+                'workers': self.max_workers,
+                'queue_depth': self.work_queue.qsize(),
+                'queue_limit': self.work_queue.maxsize,
+                'handled': handled,
+                'rejected': self.pool_stats['rejected'],
+                'open_tunnels': self.tunnel_relay.get_open_count(),
+                'avg_queue_wait_ms': round(self.pool_stats['total_queue_wait'] / handled * 1000, 2) if handled else 0,
+                'max_queue_wait_ms': round(self.pool_stats['max_queue_wait'] * 1000, 2)
+            }
+    
+    def get_upstream_pool_stats(self):
+        """Get upstream connection reuse statistics for whichever engine is running"""
+        pool = self.async_upstream_pool if self.engine == 'asyncio' else self.upstream_pool
+        return pool.get_stats()
+    
+    def aggregate_pool_stats(self, pools):
+        """Combine worker pool statistics reported by several processes"""
+        handled = sum(pool['handled'] for pool in pools)
+        return {
+            'workers': sum(pool['workers'] for pool in pools),
+            'queue_depth': sum(pool['queue_depth'] for pool in pools),
+            'queue_limit': sum(pool['queue_limit'] for pool in pools),
+            'handled': handled,
+            'rejected': sum(pool['rejected'] for pool in pools),
+            'open_tunnels': sum(pool['open_tunnels'] for pool in pools),
+            'avg_queue_wait_ms': round(sum(pool['avg_queue_wait_ms'] * pool['handled'] for pool in pools) / handled, 2) if handled else 0,
+            'max_queue_wait_ms': max(pool['max_queue_wait_ms'] for pool in pools)
+        }
+    
+    def handle_client(self, client_socket, client_address):
+        """Handle client connection, serving requests until it closes or goes idle"""
+        reader = SocketReader(client_socket)
+        try:
+            while True:
+                # Receive the next request head from client, the body is streamed later
+                client_socket.settimeout(10)
+                try:
+                    request_head = reader.read_until(b'\r\n\r\n', limit=self.max_header_size)
+                except ValueError:
+                    self.send_error_response(client_socket, 431, "Request Header Fields Too Large")
+                    break
+                if not request_head:
+                    break
+                
+                if not self.handle_request(client_socket, client_address, request_head, reader):
+                    break
+                if not self.wait_for_next_request(client_socket, reader):
+                    break
+        
+        except socket.timeout:
+            pass
+        except Exception as e:
+            print(f"Error handling client: {e}")
+        finally:
+            client_socket.close()
+    
+    def wait_for_next_request(self, client_socket, reader):
+        """Wait on an idle keep-alive connection, returns False when it should be closed"""
+        if reader.buffer:
+            # A pipelined request is already waiting
+            return True
+        
+        idle_deadline = time.time() + self.client_idle_timeout
+        client_socket.settimeout(1)
+        while time.time() < idle_deadline:
+            try:
+                return bool(client_socket.recv(1, socket.MSG_PEEK))
+            except socket.timeout:
+                if not self.work_queue.empty():
+                    # Hand the worker over to a connection waiting in the queue
+                    return False
+        return False
+    
+    def prepare_client_head(self, status_line, headers, framing, keep_alive):
+        """Rewrite hop-by-hop response headers for the client, returns (head, keep_alive)"""
+        if framing == 'close':
+            # The client can only find the end of this body by the connection closing
+            keep_alive = False
+        
+        headers = [(name, value) for name, value in headers if name.lower() not in HOP_BY_HOP_HEADERS]
+        headers.append(('Connection', 'keep-alive' if keep_alive else 'close'))
+        return build_http_head(status_line, headers), keep_alive
+    
+    def request_keep_alive(self, request_head):
+        """Whether the client wants its connection kept open after this request"""
+        request_line, headers = parse_http_head(request_head)
+        return is_keep_alive(request_line.rsplit(' ', 1)[-1], headers)
+    
+    def handle_request(self, client_socket, client_address, request_head, client_reader):
+        """Handle a single request, returns whether the client connection can stay open"""
+        parsed_request = self.parse_request(request_head)
+        if not parsed_request:
+            return False
+        method, url, host, port = parsed_request
+        keep_alive = self.request_keep_alive(request_head)
+        request_line, request_headers = parse_http_head(request_head)
+        try:
+            body_framing, body_length = request_framing(request_headers)
+        except ValueError as e:
+            # Where the body ends is ambiguous, the rest of the connection can't be trusted
+            print(f"Bad request from {client_address[0]}: {e}")
+            self.send_error_response(client_socket, 400, "Bad Request")
+            self.log_request(client_address[0], method, url, 400, 0, host)
+            return False
+        
+        # Check if domain is blocked
+        if host in self.blocked_domains:
+            self.send_blocked_response(client_socket, host)
+            self.log_request(client_address[0], method, url, 403, 0, host)
+            return False
+        
+        # Check cache for GET requests
+        cache_url = self.normalize_cache_url(url, host, port) if method == 'GET' else url
+        cache_key, entry, cache_action = self.lookup_cache(method, cache_url, request_headers)
+        flight = None
+        # A range request's 206 can't be shared, it fills the cache in the background instead
+        if cache_action in ('miss', 'revalidate') and get_header(request_headers, 'range') is None:
+            flight, leader = self.join_flight(cache_key, Flight)
+            if not leader:
+                print(f"Cache COALESCED: {url}")
+                coalesced_keep_alive = self.follow_flight(
+                    client_socket, client_address, method, url, host, request_headers,
+                    keep_alive and body_framing == 'none', flight
+                )
+                if coalesced_keep_alive is not None:
+                    return coalesced_keep_alive
+                # Nothing to share, but the other request may have refreshed the entry
+                flight = None
+                cache_key, entry, cache_action = self.lookup_cache(method, cache_url, request_headers)
+        
+        if cache_action in ('hit', 'stale'):
+            if cache_action == 'stale':
+                print(f"Cache STALE: {url}")
+                if body_framing == 'none':
+                    self.refresh_in_background(cache_url, cache_key, request_head, host, port, entry)
+            else:
+                print(f"Cache HIT: {url}")
+            # An unread request body would corrupt the next request on this connection
+            served = self.serve_cache_entry(
+                client_socket, client_address, method, url, entry, request_headers, keep_alive and body_framing == 'none'
+            )
+            if served is not None:
+                return served
+            print(f"Cache MISS (body gone): {url}")
+            entry, cache_action = None, 'miss'
+        if cache_action == 'revalidate':
+            print(f"Cache REVALIDATE: {url}")
+            request_head = self.add_cache_validators(request_head, entry)
+        elif cache_action == 'miss':
+            print(f"Cache MISS: {url}")
+        
+        if 'continue' in get_header(request_headers, 'expect', '').lower():
+            # We're going to read the body ourselves, tell the client to go ahead
+            client_socket.sendall(b'HTTP/1.1 100 Continue\r\n\r\n')
+        
+        # Forward request to destination server with better error handling
+        try:
+            if method == 'CONNECT':
+                self.tunnel_request(client_socket, client_address, url, host, port, client_reader)
+                return False
+            
+            server_socket, reader, head = self.forward_request(
+                host, port, method, request_head, client_reader, body_framing, body_length
+            )
+            
+            if head and cache_action == 'revalidate' and self.extract_status_code(head) == 304:
+                # Still valid: refresh the stored entry and serve it instead of re-downloading
+                self.release_upstream((host, port), server_socket, reader, head)
+                entry = self.refresh_cache_entry(cache_url, request_headers, entry, head)
+                served = self.serve_cache_entry(client_socket, client_address, method, url, entry, request_headers, keep_alive)
+                if served is None:
+                    raise FileNotFoundError("cached body is gone")
+                return served
+            
+            if (head and self.extract_status_code(head) in STALE_IF_ERROR_STATUS_CODES
+                    and self.can_serve_stale(entry, 'stale-if-error', request_headers)):
+                print(f"Cache STALE (upstream error {self.extract_status_code(head)}): {url}")
+                self.upstream_pool.discard(server_socket)
+                served = self.serve_cache_entry(client_socket, client_address, method, url, entry, request_headers, keep_alive)
+                if served is None:
+                    raise FileNotFoundError("cached body is gone")
+                return served
+            
+            if head:
+                # Stream the response back to client
+                status_code, sent, keep_alive = self.relay_response(
+                    client_socket, method, cache_url, request_headers, keep_alive, (host, port), server_socket, reader, head,
+                    flight
+                )
+                if status_code == 206 and cache_action in ('miss', 'revalidate') and body_framing == 'none':
+                    # Fetch the whole object once so later ranges are sliced from the cache
+                    self.refresh_in_background(cache_url, cache_key, self.full_request_head(request_head), host, port, entry)
+                
+                # Log the request
+                self.log_request(client_address[0], method, url, status_code, sent, host)
+                return keep_alive
+            else:
+                self.upstream_pool.discard(server_socket)
+                error = (502, "Empty Response from Server")
+            
+        except socket.timeout:
+            print(f"Connection timeout to {host}:{port}")
+            error = (504, "Gateway Timeout")
+        except ConnectionRefusedError:
+            print(f"Connection refused by {host}:{port}")
+            error = (502, "Connection Refused")
+        except Exception as e:
+            print(f"Error forwarding request to {host}:{port}: {e}")
+            error = (502, "Bad Gateway")
+        finally:
+            if flight:
+                self.land_flight(cache_key, flight)
+        
+        if self.can_serve_stale(entry, 'stale-if-error', request_headers):
+            print(f"Cache STALE (upstream error {error[0]}): {url}")
+            served = self.serve_cache_entry(
+                client_socket, client_address, method, url, entry, request_headers, keep_alive and body_framing == 'none'
+            )
+            if served is not None:
+                return served
+        self.send_error_response(client_socket, *error)
+        self.log_request(client_address[0], method, url, error[0], 0, host)
+        return False
+    
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE')
+    
+    def tunnel_request(self, client_socket, client_address, url, host, port, client_reader):
+        """Open a CONNECT tunnel and hand it to the tunnel relay, which relays bytes both ways
+        until either side is done"""
+        print(f"Attempting to connect to {host}:{port}")
+        server_socket = socket.create_connection((host, port), timeout=5)
+        print(f"Tunnel established to {host}:{port}")
+        
+        try:
+            client_socket.sendall(b'HTTP/1.1 200 Connection Established\r\n\r\n')
+            if client_reader.buffer:
+                # The client didn't wait for our answer before starting its handshake
+                server_socket.sendall(bytes(client_reader.buffer))
+                client_reader.buffer.clear()
+        except Exception:
+            server_socket.close()
+            raise
+        
+        # The relay gets its own descriptor of the client connection, the worker closes this one
+        # and goes back to the pool
+        self.tunnel_relay.add(
+            client_socket.dup(), server_socket,
+            lambda sent_up, sent_down: self.log_request(client_address[0], 'CONNECT', url, 200, sent_down, host)
+        )
+    
+    def prepare_upstream_head(self, request_head):
+        """Rewrite hop-by-hop headers so the upstream connection can be kept alive"""
+        request_line, headers = parse_http_head(request_head)
+        headers = [(name, value) for name, value in headers
+                   if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() != 'expect']
+        if get_header(headers, 'transfer-encoding') is not None:
+            # A chunked body is delimited by its chunks, a Content-Length next to it could be read instead
+            headers = [(name, value) for name, value in headers if name.lower() != 'content-length']
+        headers.append(('Connection', 'keep-alive'))
+        return build_http_head(request_line, headers)
+    
+    def forward_request(self, host, port, method, request_head, client_reader, body_framing, body_length):
+        """Send request upstream over a pooled connection, streaming its body from the client.
+        Returns (socket, reader, response head)"""
+        key = (host, port)
+        upstream_head = self.prepare_upstream_head(request_head)
+        
+        server_socket = self.upstream_pool.checkout(key)
+        if server_socket is not None:
+            reader = SocketReader(server_socket)
+            try:
+                server_socket.settimeout(10)
+                self.send_upstream_request(server_socket, upstream_head, client_reader, body_framing, body_length)
+                head = self.read_response_head(reader)
+            except (ConnectionError, socket.timeout):
+                head = b''
+            if head or body_framing != 'none' or method not in self.IDEMPOTENT_METHODS:
+                return server_socket, reader, head
+            # The origin dropped the idle connection, retry on a fresh one
+            self.upstream_pool.discard(server_socket)
+        
+        # Create socket with shorter timeout for faster failure
+        print(f"Attempting to connect to {host}:{port}")
+        server_socket = socket.create_connection((host, port), timeout=5)
+        self.upstream_pool.record_created()
+        print(f"Connected to {host}:{port}")
+        
+        reader = SocketReader(server_socket)
+        try:
+            server_socket.settimeout(10)  # Longer timeout for receiving data
+            self.send_upstream_request(server_socket, upstream_head, client_reader, body_framing, body_length)
+            head = self.read_response_head(reader)
+        except BaseException:
+            self.upstream_pool.discard(server_socket)
+            raise
+        return server_socket, reader, head
+    
+    def send_upstream_request(self, server_socket, upstream_head, client_reader, body_framing, body_length):
+        """Send the request head, then relay the body from the client in bounded chunks"""
+        server_socket.sendall(upstream_head)
+        for chunk in client_reader.iter_body(body_framing, body_length):
+            server_socket.sendall(encode_chunk(chunk) if body_framing == 'chunked' else chunk)
+        if body_framing == 'chunked':
+            server_socket.sendall(LAST_CHUNK)
+    
+    def read_response_head(self, reader):
+        """Read the final response head, skipping interim 1xx responses"""
+        while True:
+            head = reader.read_until(b'\r\n\r\n', limit=self.max_header_size)
+            status_code = self.extract_status_code(head)
+            if not head or not 100 <= status_code < 200 or status_code == 101:
+                return head
+    
+    def build_cached_head(self, status_line, headers, body_length):
+        """Head stored with a cached body: always delimited by Content-Length, never chunked"""
+        headers = [(name, value) for name, value in headers
+                   if name.lower() not in ('content-length', 'transfer-encoding')]
+        headers.append(('Content-Length', str(body_length)))
+        return build_http_head(status_line, headers)
+    
+    def is_cacheable(self, method, status_code, headers, request_headers):
+        """Whether a response should be written to the cache"""
+        return method == 'GET' and self.cache_enabled and is_storable(status_code, headers, request_headers)
+    
+    def normalize_cache_url(self, url, host, port):
+        """Base cache key of a request target"""
+        return normalize_url(url, host, port, self.cache_sort_query, self.cache_strip_params)
+    
+    def get_vary(self, base_key):
+        """Vary header names of the responses cached for a base key, '' if they don't vary"""
+        vary = self.vary_index.get(base_key)
+        if vary is None:
+            row = self.db.fetchone("SELECT vary FROM cache WHERE base_key = ? LIMIT 1", (base_key,))
+            vary = row[0] or '' if row else ''
+            self.vary_index.put(base_key, vary, len(base_key) + len(vary))
+        return vary
+    
+    def lookup_cache(self, method, cache_url, request_headers):
+        """Decide how the cache can answer a request, returns (cache key, entry, action) where action
+        is 'hit', 'stale' (serve, then refresh in the background), 'revalidate', 'miss' or 'bypass'.
+        Stale misses still return their entry for stale-if-error"""
+        if method != 'GET' or not self.cache_enabled:
+            return cache_url, None, 'bypass'
+        directives = request_cache_directives(request_headers)
+        if 'no-store' in directives:
+            return cache_url, None, 'bypass'
+        cache_key = variant_key(cache_url, self.get_vary(cache_url), request_headers)
+        return (cache_key,) + self.check_cache_entry(cache_key, directives, request_headers)
+    
+    def check_cache_entry(self, cache_key, directives, request_headers):
+        """Decide how the cached entry for a key can be used, returns (entry, action)"""
+        entry = self.get_cache_entry(cache_key)
+        if entry is None:
+            return None, 'miss'
+        
+        now = time.time()
+        headers = entry_headers(entry)
+        max_age = directive_seconds(directives, 'max-age')
+        client_requires_validation = 'no-cache' in directives or (
+            max_age is not None and current_age(headers, entry['stored'], now) > max_age)
+        if client_requires_validation:
+            fresh = False
+        else:
+            fresh = entry['expires'] is not None and now < entry['expires']
+        
+        if fresh:
+            return entry, 'hit'
+        if not client_requires_validation and self.can_serve_stale(entry, 'stale-while-revalidate', request_headers):
+            return entry, 'stale'
+        if not is_conditional(request_headers) and has_validator(headers):
+            return entry, 'revalidate'
+        # Let the origin answer the client's own conditional request
+        return entry, 'miss'
+    
+    def can_serve_stale(self, entry, directive, request_headers):
+        """Whether an entry is still within its stale-while-revalidate or stale-if-error window, and
+        the request's own directives accept a stale response (RFC 9111 section 5.2.1)"""
+        if entry is None:
+            return False
+        now = time.time()
+        headers = entry_headers(entry)
+        expires = entry['expires'] if entry['expires'] is not None else entry['stored']
+        directives = request_cache_directives(request_headers)
+        if 'no-cache' in directives or 'min-fresh' in directives:
+            return False
+        max_stale = directive_seconds(directives, 'max-stale')
+        if max_stale is not None and now - expires > max_stale:
+            return False
+        # max-stale is the client saying how much past max-age it will take
+        max_age = directive_seconds(directives, 'max-age')
+        if max_age is not None and 'max-stale' not in directives and current_age(headers, entry['stored'], now) > max_age:
+            return False
+        default = self.stale_while_revalidate if directive == 'stale-while-revalidate' else self.stale_if_error
+        return now - expires <= stale_window(headers, directive, default)
+    
+    def add_cache_validators(self, request_head, entry):
+        """Make a request conditional on the validators of a stale cache entry"""
+        request_line, headers = parse_http_head(request_head)
+        cached_headers = entry_headers(entry)
+        etag = get_header(cached_headers, 'etag')
+        last_modified = get_header(cached_headers, 'last-modified')
+        # Our validators replace whatever the client was asking about
+        headers = [(name, value) for name, value in headers
+                   if name.lower() not in ('if-none-match', 'if-modified-since')]
+        if etag is not None:
+            headers.append(('If-None-Match', etag))
+        if last_modified is not None:
+            headers.append(('If-Modified-Since', last_modified))
+        return build_http_head(request_line, headers)
+    
+    def full_request_head(self, request_head):
+        """A range request made unconditional and for the whole object, to fill the cache with"""
+        request_line, headers = parse_http_head(request_head)
+        headers = [(name, value) for name, value in headers
+                   if name.lower() not in ('range', 'if-range', 'if-none-match', 'if-modified-since')]
+        return build_http_head(request_line, headers)
+    
+    def exceeds_cache_object_size(self, head):
+        """Whether a response announces a body too large to cache, a background fetch of it is wasted"""
+        content_length = get_header(parse_http_head(head)[1], 'content-length', '')
+        return content_length.isdigit() and int(content_length) > self.cache_max_object_size
+    
+    def refresh_cache_entry(self, cache_url, request_headers, entry, head):
+        """Update a stored response with the headers of a 304 (RFC 9111 section 4.3.4)"""
+        response_data = entry['response']
+        head_end = response_data.find(b'\r\n\r\n')
+        status_line, headers = parse_http_head(response_data[:head_end])
+        _, new_headers = parse_http_head(head)
+        updated = {name.lower() for name, value in new_headers
+                   if name.lower() not in NOT_MODIFIED_SKIP_HEADERS and name.lower() not in HOP_BY_HOP_HEADERS}
+        headers = [(name, value) for name, value in headers if name.lower() not in updated]
+        headers += [(name, value) for name, value in new_headers if name.lower() in updated]
+        response_data = build_http_head(status_line, headers) + response_data[head_end + 4:]
+        return (self.store_response(cache_url, request_headers, response_data, entry.get('blob'))
+                or dict(entry, response=response_data))
+    
+    def serve_cache_entry(self, client_socket, client_address, method, url, entry, request_headers, keep_alive):
+        """Answer a request from a cache entry, with a 304 if the client's validators match.
+        Returns whether the connection can stay open, or None without sending anything if the
+        entry's body is gone"""
+        entry = self.negotiate_encoding(entry, request_headers)
+        body = self.open_cache_body(entry)
+        if body is False:
+            return None
+        sent = 0
+        try:
+            not_modified = is_conditional(request_headers) and validator_matches(request_headers, entry_headers(entry))
+            status_code, segments, keep_alive = self.build_cache_hit_response(
+                entry, method, request_headers, keep_alive, not_modified
+            )
+            for segment in segments:
+                if isinstance(segment, bytes):
+                    client_socket.sendall(segment)
+                    sent += len(segment)
+                else:
+                    # The kernel copies the body straight from the page cache to the socket
+                    sent += client_socket.sendfile(body, *segment)
+        finally:
+            if body:
+                body.close()
+        self.log_request(client_address[0], method, url, status_code, sent, url_host(entry['key']))
+        return keep_alive
+    
+    def open_cache_body(self, entry):
+        """Open the blob of an entry before anything is sent, None if the body is inline. Returns
+        False and forgets the entry if the blob was evicted or replaced since the entry was read"""
+        if not entry.get('blob'):
+            return None
+        try:
+            return open(self.blob_store.path(entry['blob']), 'rb')
+        except FileNotFoundError:
+            self.forget_cache_entry(entry['key'])
+            return False
+    
+    def forget_cache_entry(self, url):
+        """Drop an entry and its compressed variants from the memory tier"""
+        self.cache.pop(url)
+        for encoding in COMPRESSORS:
+            self.cache.pop((url, encoding))
+    
+    def negotiate_encoding(self, entry, request_headers):
+        """The form of a cache entry to send for the client's Accept-Encoding"""
+        if not entry.get('encodings'):
+            return entry
+        encoding = select_encoding(get_header(request_headers, 'accept-encoding'), entry['encodings'])
+        variant = self.get_encoded_entry(entry['key'], encoding) if encoding else None
+        if variant is not None:
+            return dict(entry, response=variant['response'], blob=variant['blob'])
+        response_data = entry['response']
+        head_end = response_data.find(b'\r\n\r\n')
+        status_line, headers = parse_http_head(response_data[:head_end])
+        return dict(entry, response=build_http_head(status_line, vary_on_accept_encoding(headers)) + response_data[head_end + 4:])
+    
+    def release_upstream(self, key, server_socket, reader, head):
+        """Return the connection of a bodiless upstream response to the pool"""
+        status_line, headers = parse_http_head(head)
+        if is_keep_alive(status_line.split(' ', 1)[0], headers) and not reader.buffer:
+            self.upstream_pool.checkin(key, server_socket)
+        else:
+            self.upstream_pool.discard(server_socket)
+    
+    def refresh_in_background(self, cache_url, cache_key, request_head, host, port, entry):
+        """Revalidate a stale entry that was just served, or fetch a missing one (entry None),
+        unless a fetch for it is already running"""
+        flight = self.claim_flight(cache_key, AsyncFlight if self.engine == 'asyncio' else Flight)
+        if flight is None:
+            return
+        print(f"{'Refreshing' if entry else 'Filling'} in background: {cache_key}")
+        if self.engine == 'asyncio':
+            if len(self.background_tasks) >= self.refresh_workers + self.refresh_queue.maxsize:
+                print(f"Refreshes backlogged, not refreshing: {cache_key}")
+                self.land_flight(cache_key, flight)
+                return
+            task = self.loop.create_task(
+                self.refresh_cache_entry_async(cache_url, cache_key, request_head, host, port, entry, flight)
+            )
+            # The loop only keeps weak references to tasks
+            self.background_tasks.add(task)
+            task.add_done_callback(self.background_tasks.discard)
+        else:
+            try:
+                self.refresh_queue.put_nowait((cache_url, cache_key, request_head, host, port, entry, flight))
+            except queue.Full:
+                print(f"Refreshes backlogged, not refreshing: {cache_key}")
+                self.land_flight(cache_key, flight)
+    
+    def start_refreshers(self):
+        """Start the threads that run background refreshes for the threaded engine"""
+        if self.engine == 'asyncio':
+            return
+        for index in range(self.refresh_workers):
+            refresher = threading.Thread(target=self.refresher_loop, name=f'refresher-{index}', daemon=True)
+            refresher.start()
+            self.refreshers.append(refresher)
+    
+    def stop_refreshers(self):
+        """Stop the refresher threads once they finish their current fetch"""
+        for _ in self.refreshers:
+            self.refresh_queue.put(None)
+        self.refreshers = []
+    
+    def refresher_loop(self):
+        """Run queued background refreshes one at a time until stopped"""
+        while True:
+            job = self.refresh_queue.get()
+            if job is None:
+                break
+            self.refresh_cache_entry_upstream(*job)
+    
+    def refresh_cache_entry_upstream(self, cache_url, cache_key, request_head, host, port, entry, flight):
+        """Fetch a stale entry again, conditionally if it has validators, and store the result"""
+        request_headers = parse_http_head(request_head)[1]
+        try:
+            server_socket, reader, head = self.forward_request(
+                host, port, 'GET', self.add_cache_validators(request_head, entry) if entry else request_head,
+                SocketReader(None), 'none', None
+            )
+            if not head or self.exceeds_cache_object_size(head):
+                self.upstream_pool.discard(server_socket)
+            elif entry and self.extract_status_code(head) == 304:
+                self.release_upstream((host, port), server_socket, reader, head)
+                self.refresh_cache_entry(cache_url, request_headers, entry, head)
+            else:
+                self.relay_response(
+                    None, 'GET', cache_url, request_headers, False, (host, port), server_socket, reader, head, flight
+                )
+        except Exception as e:
+            print(f"Error refreshing {cache_key}: {e}")
+        finally:
+            self.land_flight(cache_key, flight)
+    
+    def build_cache_hit_response(self, entry, method, request_headers, keep_alive, not_modified=False):
+        """Client response for a cache entry with its current Age, sliced if the request has a Range.
+        Returns (status code, segments, keep_alive) where segments are bytes, or (offset, count) slices
+        of the entry's body in the blob store"""
+        response_data = entry['response']
+        head_end = response_data.find(b'\r\n\r\n')
+        status_line, headers = parse_http_head(response_data[:head_end])
+        age = int(current_age(headers, entry['stored'], time.time()))
+        headers = [(name, value) for name, value in headers if name.lower() != 'age']
+        headers.append(('Age', str(age)))
+        body = response_data[head_end + 4:]
+        blob = entry.get('blob')
+        status_code = self.extract_status_code(response_data)
+        
+        if not_modified:
+            status_code = 304
+            status_line = status_line.split(' ', 1)[0] + ' 304 Not Modified'
+            headers = [(name, value) for name, value in headers if name.lower() in NOT_MODIFIED_HEADERS]
+            framing = 'none'
+            segments = []
+        else:
+            framing, length = response_framing(method, status_code, headers)
+            if framing == 'none':
+                segments = []
+            else:
+                segments = [(0, length)] if blob else [body]
+            if status_code == 200 and framing == 'length':
+                headers = [(name, value) for name, value in headers if name.lower() != 'accept-ranges']
+                headers.append(('Accept-Ranges', 'bytes'))
+                ranges = parse_range(get_header(request_headers, 'range'), length)
+                if ranges is not None and method == 'GET' and if_range_matches(get_header(request_headers, 'if-range'), headers):
+                    part = (lambda first, last: (first, last - first + 1)) if blob else (lambda first, last: body[first:last + 1])
+                    status_code, status_line, headers, segments = range_response(status_line, headers, ranges, length, part)
+        head, keep_alive = self.prepare_client_head(status_line, headers, framing, keep_alive)
+        if not blob:
+            return status_code, [head + b''.join(segments)], keep_alive
+        return status_code, [head] + segments, keep_alive
+    
+    def join_flight(self, url, flight_class):
+        """Join the fetch in progress for URL, or start one. Returns (flight, leader)"""
+        with self.flights_lock:
+            flight = self.flights.get(url)
+            if flight is not None and not flight.done:
+                self.coalescing_stats['coalesced'] += 1
+                return flight, False
+            flight = self.flights[url] = flight_class()
+            self.coalescing_stats['fetches'] += 1
+            return flight, True
+    
+    def claim_flight(self, url, flight_class):
+        """Start a fetch for URL, returns None if one is already in progress"""
+        with self.flights_lock:
+            flight = self.flights.get(url)
+            if flight is not None and not flight.done:
+                return None
+            flight = self.flights[url] = flight_class()
+            self.coalescing_stats['fetches'] += 1
+            return flight
+    
+    def land_flight(self, url, flight):
+        """End a fetch started by join_flight, releasing anyone still waiting on it"""
+        flight.finish(False)
+        with self.flights_lock:
+            if self.flights.get(url) is flight:
+                del self.flights[url]
+    
+    def count_flight_fallback(self):
+        """Count a coalesced request that had to go upstream after all"""
+        with self.flights_lock:
+            self.coalescing_stats['fallbacks'] += 1
+    
+    def follow_flight(self, client_socket, client_address, method, url, host, request_headers, keep_alive, flight):
+        """Serve a request from another request's upstream fetch. Returns keep_alive, or None if
+        that response can't be shared and the request has to be handled on its own"""
+        response = flight.wait_response()
+        if response is None or not flight.matches(request_headers):
+            self.count_flight_fallback()
+            return None
+        
+        status_line, headers, framing, length = response
+        client_head, keep_alive = self.prepare_client_head(status_line, headers, framing, keep_alive)
+        sent = 0
+        try:
+            client_socket.sendall(client_head)
+            sent += len(client_head)
+            for chunk in flight.iter_chunks():
+                data = encode_chunk(chunk) if framing == 'chunked' else chunk
+                client_socket.sendall(data)
+                sent += len(data)
+            if framing == 'chunked':
+                client_socket.sendall(LAST_CHUNK)
+                sent += len(LAST_CHUNK)
+        except Exception as e:
+            print(f"Error relaying shared response for {url}: {e}")
+            keep_alive = False
+        
+        self.log_request(client_address[0], method, url, self.extract_status_code(client_head), sent, host)
+        return keep_alive
+    
+    def relay_response(self, client_socket, method, url, request_headers, keep_alive, key, server_socket, reader, head,
+                       flight=None):
+        """Stream an upstream response to the client as it arrives, teeing cacheable bodies
+        into the cache and to requests coalesced on the flight. Returns (status code, bytes sent, keep_alive)"""
+        status_line, headers = parse_http_head(head)
+        status_code = self.extract_status_code(head)
+        framing, length = response_framing(method, status_code, headers)
+        reusable = framing != 'close' and is_keep_alive(status_line.split(' ', 1)[0], headers)
+        
+        # Only buffer what we intend to cache, and never more than the object size limit
+        cache_chunks = None
+        if self.is_cacheable(method, status_code, headers, request_headers) and (length or 0) <= self.cache_max_object_size:
+            cache_chunks = []
+            cache_size = 0
+        if flight:
+            if cache_chunks is not None:
+                flight.publish(status_line, headers, framing, length, variant_key('', vary_names(headers), request_headers))
+            else:
+                # Not cacheable, so not shareable either: let waiting requests go upstream themselves
+                flight.finish(False)
+                flight = None
+        
+        client_head, keep_alive = self.prepare_client_head(status_line, headers, framing, keep_alive)
+        sent = 0
+        complete = False
+        
+        def send(data):
+            # Without a client (a background refresh), or once it has gone away, the body still
+            # goes to the cache and to the requests following the flight
+            nonlocal client_socket, keep_alive, sent
+            if client_socket is None:
+                return
+            try:
+                client_socket.sendall(data)
+                sent += len(data)
+            except OSError as e:
+                print(f"Client went away while relaying {url}: {e}")
+                client_socket, keep_alive = None, False
+        
+        try:
+            send(client_head)
+            for chunk in reader.iter_body(framing, length):
+                if cache_chunks is not None:
+                    cache_size += len(chunk)
+                    if cache_size > self.cache_max_object_size:
+                        cache_chunks = None
+                        if flight:
+                            # Don't buffer an oversized body for followers either
+                            flight.finish(False)
+                            flight = None
+                    else:
+                        cache_chunks.append(chunk)
+                        if flight:
+                            flight.add_chunk(chunk)
+                if cache_chunks is None and not client_socket:
+                    # Nobody left to deliver to: close the connection rather than drain it
+                    break
+                # Bodies are decoded while reading, chunked ones are re-framed for the client
+                send(encode_chunk(chunk) if framing == 'chunked' else chunk)
+            else:
+                if framing == 'chunked':
+                    send(LAST_CHUNK)
+                complete = True
+        except Exception as e:
+            print(f"Error relaying response for {url}: {e}")
+            keep_alive = False
+        finally:
+            if complete and reusable and not reader.buffer:
+                self.upstream_pool.checkin(key, server_socket)
+            else:
+                self.upstream_pool.discard(server_socket)
+        
+        if complete and cache_chunks is not None:
+            print(f"Caching response for: {url}")
+            body = b''.join(cache_chunks)
+            self.store_response(url, request_headers, self.build_cached_head(status_line, headers, len(body)) + body)
+        if flight:
+            # Only now, so requests arriving after the flight find the entry in the cache
+            flight.finish(complete)
+        return status_code, sent, keep_alive
+    
+    async def serve_async(self):
+        """Run the accept loop and all client connections on one event loop"""
+        self.loop = asyncio.get_running_loop()
+        self.async_stop_event = asyncio.Event()
+        
+        server = await asyncio.start_server(
+            self.handle_client_async, sock=self.server_socket, backlog=self.backlog, limit=self.max_header_size
+        )
+        try:
+            async with server:
+                await self.async_stop_event.wait()
+        finally:
+            self.loop = None
+    
+    async def run_blocking(self, func, *args):
+        """Run a blocking call (database access) off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+    
+    async def handle_client_async(self, reader, writer):
+        """Handle client connection as a coroutine, serving requests until it closes or goes idle"""
+        client_address = writer.get_extra_info('peername')
+        first_request = True
+        try:
+            while True:
+                # Receive the next request head from client, the body is streamed later
+                try:
+                    request_head = await self.read_request_head_async(
+                        reader, 10 if first_request else self.client_idle_timeout
+                    )
+                except asyncio.LimitOverrunError:
+                    await self.send_error_response_async(writer, 431, "Request Header Fields Too Large")
+                    break
+                if not request_head:
+                    break
+                first_request = False
+                
+                if not await self.handle_request_async(writer, client_address, request_head, reader):
+                    break
+        
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            print(f"Error handling client: {e}")
+        finally:
+            writer.close()
+    
+    async def read_request_head_async(self, reader, timeout):
+        """Read the next request head from the client, b'' if it closed the connection"""
+        try:
+            return await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=timeout)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise
+            return b''
+    
+    async def handle_request_async(self, writer, client_address, request_head, client_reader):
+        """Handle a single request, returns whether the client connection can stay open"""
+        parsed_request = self.parse_request(request_head)
+        if not parsed_request:
+            return False
+        method, url, host, port = parsed_request
+        keep_alive = self.request_keep_alive(request_head)
+        request_line, request_headers = parse_http_head(request_head)
+        try:
+            body_framing, body_length = request_framing(request_headers)
+        except ValueError as e:
+            # Where the body ends is ambiguous, the rest of the connection can't be trusted
+            print(f"Bad request from {client_address[0]}: {e}")
+            await self.send_error_response_async(writer, 400, "Bad Request")
+            await self.run_blocking(self.log_request, client_address[0], method, url, 400, 0, host)
+            return False
+        
+        # Check if domain is blocked
+        if host in self.blocked_domains:
+            writer.write(self.build_blocked_response(host))
+            await writer.drain()
+            await self.run_blocking(self.log_request, client_address[0], method, url, 403, 0, host)
+            return False
+        
+        # Check cache for GET requests
+        cache_url = self.normalize_cache_url(url, host, port) if method == 'GET' else url
+        cache_key, entry, cache_action = await self.run_blocking(self.lookup_cache, method, cache_url, request_headers)
+        flight = None
+        # A range request's 206 can't be shared, it fills the cache in the background instead
+        if cache_action in ('miss', 'revalidate') and get_header(request_headers, 'range') is None:
+            flight, leader = self.join_flight(cache_key, AsyncFlight)
+            if not leader:
+                print(f"Cache COALESCED: {url}")
+                coalesced_keep_alive = await self.follow_flight_async(
+                    writer, client_address, method, url, host, request_headers, keep_alive and body_framing == 'none',
+                    flight
+                )
+                if coalesced_keep_alive is not None:
+                    return coalesced_keep_alive
+                # Nothing to share, but the other request may have refreshed the entry
+                flight = None
+                cache_key, entry, cache_action = await self.run_blocking(
+                    self.lookup_cache, method, cache_url, request_headers
+                )
+        
+        if cache_action in ('hit', 'stale'):
+            if cache_action == 'stale':
+                print(f"Cache STALE: {url}")
+                if body_framing == 'none':
+                    self.refresh_in_background(cache_url, cache_key, request_head, host, port, entry)
+            else:
+                print(f"Cache HIT: {url}")
+            # An unread request body would corrupt the next request on this connection
+            served = await self.serve_cache_entry_async(
+                writer, client_address, method, url, entry, request_headers, keep_alive and body_framing == 'none'
+            )
+            if served is not None:
+                return served
+            print(f"Cache MISS (body gone): {url}")
+            entry, cache_action = None, 'miss'
+        if cache_action == 'revalidate':
+            print(f"Cache REVALIDATE: {url}")
+            request_head = self.add_cache_validators(request_head, entry)
+        elif cache_action == 'miss':
+            print(f"Cache MISS: {url}")
+        
+        if 'continue' in get_header(request_headers, 'expect', '').lower():
+            # We're going to read the body ourselves, tell the client to go ahead
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+            await writer.drain()
+        
+        # Forward request to destination server
+        try:
+            if method == 'CONNECT':
+                await self.tunnel_request_async(writer, client_address, url, host, port, client_reader)
+                return False
+            
+            connection, head = await self.forward_request_async(
+                host, port, method, request_head, client_reader, body_framing, body_length
+            )
+            
+            if head and cache_action == 'revalidate' and self.extract_status_code(head) == 304:
+                # Still valid: refresh the stored entry and serve it instead of re-downloading
+                self.release_upstream_async((host, port), connection, head)
+                entry = await self.run_blocking(self.refresh_cache_entry, cache_url, request_headers, entry, head)
+                served = await self.serve_cache_entry_async(
+                    writer, client_address, method, url, entry, request_headers, keep_alive
+                )
+                if served is None:
+                    raise FileNotFoundError("cached body is gone")
+                return served
+            
+            if (head and self.extract_status_code(head) in STALE_IF_ERROR_STATUS_CODES
+                    and self.can_serve_stale(entry, 'stale-if-error', request_headers)):
+                print(f"Cache STALE (upstream error {self.extract_status_code(head)}): {url}")
+                self.async_upstream_pool.discard(connection)
+                served = await self.serve_cache_entry_async(
+                    writer, client_address, method, url, entry, request_headers, keep_alive
+                )
+                if served is None:
+                    raise FileNotFoundError("cached body is gone")
+                return served
+            
+            if head:
+                # Stream the response back to client
+                status_code, sent, keep_alive = await self.relay_response_async(
+                    writer, method, cache_url, request_headers, keep_alive, (host, port), connection, head, flight
+                )
+                if status_code == 206 and cache_action in ('miss', 'revalidate') and body_framing == 'none':
+                    # Fetch the whole object once so later ranges are sliced from the cache
+                    self.refresh_in_background(cache_url, cache_key, self.full_request_head(request_head), host, port, entry)
+                await self.run_blocking(self.log_request, client_address[0], method, url, status_code, sent, host)
+                return keep_alive
+            else:
+                self.async_upstream_pool.discard(connection)
+                error = (502, "Empty Response from Server")
+        
+        except asyncio.TimeoutError:
+            print(f"Connection timeout to {host}:{port}")
+            error = (504, "Gateway Timeout")
+        except ConnectionRefusedError:
+            print(f"Connection refused by {host}:{port}")
+            error = (502, "Connection Refused")
+        except Exception as e:
+            print(f"Error forwarding request to {host}:{port}: {e}")
+            error = (502, "Bad Gateway")
+        finally:
+            if flight:
+                self.land_flight(cache_key, flight)
+        
+        if self.can_serve_stale(entry, 'stale-if-error', request_headers):
+            print(f"Cache STALE (upstream error {error[0]}): {url}")
+            served = await self.serve_cache_entry_async(
+                writer, client_address, method, url, entry, request_headers, keep_alive and body_framing == 'none'
+            )
+            if served is not None:
+                return served
+        await self.send_error_response_async(writer, *error)
+        await self.run_blocking(self.log_request, client_address[0], method, url, error[0], 0, host)
+        return False
+    
+    async def tunnel_request_async(self, writer, client_address, url, host, port, client_reader):
+        """Open a CONNECT tunnel and relay bytes both ways until either side is done"""
+        print(f"Attempting to connect to {host}:{port}")
+        upstream_reader, upstream_writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=5)
+        print(f"Tunnel established to {host}:{port}")
+        
+        writer.write(b'HTTP/1.1 200 Connection Established\r\n\r\n')
+        # When either direction last moved data, the tunnel idles out only when both are quiet
+        activity = [time.time()]
+        try:
+            sent_up, sent_down = await asyncio.gather(
+                self.pipe_stream_async(client_reader, upstream_writer, activity),
+                self.pipe_stream_async(upstream_reader, writer, activity)
+            )
+        finally:
+            upstream_writer.close()
+        
+        await self.run_blocking(self.log_request, client_address[0], 'CONNECT', url, 200, sent_down, host)
+    
+    async def pipe_stream_async(self, reader, writer, activity):
+        """Copy one direction of a tunnel until end of stream, returns the bytes copied. activity
+        holds the time either direction last moved data, shared so a one-way transfer keeps the
+        quiet direction open"""
+        transferred = 0
+        try:
+            while True:
+                try:
+                    data = await asyncio.wait_for(
+                        reader.read(65536), timeout=activity[0] + self.tunnel_idle_timeout - time.time()
+                    )
+                except asyncio.TimeoutError:
+                    if time.time() - activity[0] < self.tunnel_idle_timeout:
+                        continue
+                    raise
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+                transferred += len(data)
+                activity[0] = time.time()
+            # Pass the half-close on so the other side sees end of stream
+            if writer.can_write_eof():
+                writer.write_eof()
+        except (ConnectionError, asyncio.TimeoutError, OSError):
+            writer.close()
+        return transferred
+    
+    async def forward_request_async(self, host, port, method, request_head, client_reader, body_framing, body_length):
+        """Send request upstream over a pooled connection, streaming its body from the client.
+        Returns (connection, response head)"""
+        key = (host, port)
+        upstream_head = self.prepare_upstream_head(request_head)
+        
+        connection = self.async_upstream_pool.checkout(key)
+        if connection is not None:
+            try:
+                head = await self.send_upstream_request_async(
+                    connection, upstream_head, client_reader, body_framing, body_length
+                )
+            except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                head = b''
+            if head or body_framing != 'none' or method not in self.IDEMPOTENT_METHODS:
+                return connection, head
+            # The origin dropped the idle connection, retry on a fresh one
+            self.async_upstream_pool.discard(connection)
+        
+        print(f"Attempting to connect to {host}:{port}")
+        connection = await asyncio.wait_for(
+            asyncio.open_connection(host, port, limit=self.max_header_size), timeout=5
+        )
+        self.async_upstream_pool.record_created()
+        print(f"Connected to {host}:{port}")
+        
+        try:
+            head = await self.send_upstream_request_async(
+                connection, upstream_head, client_reader, body_framing, body_length
+            )
+        except BaseException:
+            self.async_upstream_pool.discard(connection)
+            raise
+        return connection, head
+    
+    async def send_upstream_request_async(self, connection, upstream_head, client_reader, body_framing, body_length):
+        """Send the request with its body streamed from the client, then read the final response
+        head. Returns b'' if the origin closed"""
+        upstream_reader, upstream_writer = connection
+        upstream_writer.write(upstream_head)
+        async for chunk in iter_body_async(client_reader, body_framing, body_length):
+            upstream_writer.write(encode_chunk(chunk) if body_framing == 'chunked' else chunk)
+            await upstream_writer.drain()
+        if body_framing == 'chunked':
+            upstream_writer.write(LAST_CHUNK)
+        await upstream_writer.drain()
+        
+        while True:
+            try:
+                head = await asyncio.wait_for(upstream_reader.readuntil(b'\r\n\r\n'), timeout=10)
+            except asyncio.IncompleteReadError as e:
+                if e.partial:
+                    raise
+                return b''
+            # Skip interim 1xx responses
+            status_code = self.extract_status_code(head)
+            if not 100 <= status_code < 200 or status_code == 101:
+                return head
+    
+    async def serve_cache_entry_async(self, writer, client_address, method, url, entry, request_headers, keep_alive):
+        """Answer a request from a cache entry, with a 304 if the client's validators match.
+        Returns whether the connection can stay open, or None without sending anything if the
+        entry's body is gone"""
+        if entry.get('encodings'):
+            # Picking a compressed variant may read it from SQLite
+            entry = await self.run_blocking(self.negotiate_encoding, entry, request_headers)
+        body = self.open_cache_body(entry)
+        if body is False:
+            return None
+        sent = 0
+        try:
+            not_modified = is_conditional(request_headers) and validator_matches(request_headers, entry_headers(entry))
+            status_code, segments, keep_alive = self.build_cache_hit_response(
+                entry, method, request_headers, keep_alive, not_modified
+            )
+            for segment in segments:
+                if isinstance(segment, bytes):
+                    writer.write(segment)
+                    sent += len(segment)
+                else:
+                    await writer.drain()
+                    # Uses os.sendfile() on plain sockets, and falls back to reading the file otherwise
+                    sent += await self.loop.sendfile(writer.transport, body, *segment)
+            await writer.drain()
+        finally:
+            if body:
+                body.close()
+        await self.run_blocking(
+            self.log_request, client_address[0], method, url, status_code, sent, url_host(entry['key'])
+        )
+        return keep_alive
+    
+    def release_upstream_async(self, key, connection, head):
+        """Return the connection of a bodiless upstream response to the pool"""
+        status_line, headers = parse_http_head(head)
+        if is_keep_alive(status_line.split(' ', 1)[0], headers):
+            self.async_upstream_pool.checkin(key, connection)
+        else:
+            self.async_upstream_pool.discard(connection)
+    
+    async def refresh_cache_entry_async(self, cache_url, cache_key, request_head, host, port, entry, flight):
+        """Fetch a stale entry again, conditionally if it has validators, and store the result"""
+        request_headers = parse_http_head(request_head)[1]
+        try:
+            connection, head = await self.forward_request_async(
+                host, port, 'GET', self.add_cache_validators(request_head, entry) if entry else request_head,
+                None, 'none', None
+            )
+            if not head or self.exceeds_cache_object_size(head):
+                self.async_upstream_pool.discard(connection)
+            elif entry and self.extract_status_code(head) == 304:
+                self.release_upstream_async((host, port), connection, head)
+                await self.run_blocking(self.refresh_cache_entry, cache_url, request_headers, entry, head)
+            else:
+                await self.relay_response_async(
+                    None, 'GET', cache_url, request_headers, False, (host, port), connection, head, flight
+                )
+        except Exception as e:
+            print(f"Error refreshing {cache_key}: {e}")
+        finally:
+            self.land_flight(cache_key, flight)
+    
+    async def follow_flight_async(self, writer, client_address, method, url, host, request_headers, keep_alive,
+                                  flight):
+        """Serve a request from another request's upstream fetch. Returns keep_alive, or None if
+        that response can't be shared and the request has to be handled on its own"""
+        response = await flight.wait_response_async()
+        if response is None or not flight.matches(request_headers):
+            self.count_flight_fallback()
+            return None
+        
+        status_line, headers, framing, length = response
+        client_head, keep_alive = self.prepare_client_head(status_line, headers, framing, keep_alive)
+        sent = 0
+        try:
+            writer.write(client_head)
+            sent += len(client_head)
+            async for chunk in flight.iter_chunks_async():
+                data = encode_chunk(chunk) if framing == 'chunked' else chunk
+                writer.write(data)
+                await writer.drain()
+                sent += len(data)
+            if framing == 'chunked':
+                writer.write(LAST_CHUNK)
+                sent += len(LAST_CHUNK)
+            await writer.drain()
+        except Exception as e:
+            print(f"Error relaying shared response for {url}: {e}")
+            keep_alive = False
+        
+        await self.run_blocking(
+            self.log_request, client_address[0], method, url, self.extract_status_code(client_head), sent, host
+        )
+        return keep_alive
+    
+    async def relay_response_async(self, writer, method, url, request_headers, keep_alive, key, connection, head,
+                                   flight=None):
+        """Stream an upstream response to the client as it arrives, teeing cacheable bodies
+        into the cache and to requests coalesced on the flight. Returns (status code, bytes sent, keep_alive)"""
+        status_line, headers = parse_http_head(head)
+        status_code = self.extract_status_code(head)
+        framing, length = response_framing(method, status_code, headers)
+        reusable = framing != 'close' and is_keep_alive(status_line.split(' ', 1)[0], headers)
+        
+        # Only buffer what we intend to cache, and never more than the object size limit
+        cache_chunks = None
+        if self.is_cacheable(method, status_code, headers, request_headers) and (length or 0) <= self.cache_max_object_size:
+            cache_chunks = []
+            cache_size = 0
+        if flight:
+            if cache_chunks is not None:
+                flight.publish(status_line, headers, framing, length, variant_key('', vary_names(headers), request_headers))
+            else:
+                # Not cacheable, so not shareable either: let waiting requests go upstream themselves
+                flight.finish(False)
+                flight = None
+        
+        client_head, keep_alive = self.prepare_client_head(status_line, headers, framing, keep_alive)
+        sent = 0
+        complete = False
+        
+        async def write(data):
+            # Without a client (a background refresh), or once it has gone away, the body still
+            # goes to the cache and to the requests following the flight
+            nonlocal writer, keep_alive, sent
+            if writer is None:
+                return
+            try:
+                writer.write(data)
+                await writer.drain()
+                sent += len(data)
+            except (ConnectionError, OSError) as e:
+                print(f"Client went away while relaying {url}: {e}")
+                writer, keep_alive = None, False
+        
+        try:
+            await write(client_head)
+            async for chunk in iter_body_async(connection[0], framing, length):
+                if cache_chunks is not None:
+                    cache_size += len(chunk)
+                    if cache_size > self.cache_max_object_size:
+                        cache_chunks = None
+                        if flight:
+                            # Don't buffer an oversized body for followers either
+                            flight.finish(False)
+                            flight = None
+                    else:
+                        cache_chunks.append(chunk)
+                        if flight:
+                            flight.add_chunk(chunk)
+                if cache_chunks is None and not writer:
+                    # Nobody left to deliver to: close the connection rather than drain it
+                    break
+                # Bodies are decoded while reading, chunked ones are re-framed for the client
+                await write(encode_chunk(chunk) if framing == 'chunked' else chunk)
+            else:
+                if framing == 'chunked':
+                    await write(LAST_CHUNK)
+                complete = True
+        except Exception as e:
+            print(f"Error relaying response for {url}: {e}")
+            keep_alive = False
+        finally:
+            if complete and reusable:
+                self.async_upstream_pool.checkin(key, connection)
+            else:
+                self.async_upstream_pool.discard(connection)
+        
+        if complete and cache_chunks is not None:
+            print(f"Caching response for: {url}")
+            body = b''.join(cache_chunks)
+            await self.run_blocking(
+                self.store_response, url, request_headers, self.build_cached_head(status_line, headers, len(body)) + body
+            )
+        if flight:
+            # Only now, so requests arriving after the flight find the entry in the cache
+            flight.finish(complete)
+        return status_code, sent, keep_alive
+    
+    async def send_error_response_async(self, writer, status_code, message):
+        """Send error response on an asyncio stream"""
+        writer.write(self.build_error_response(status_code, message))
+        await writer.drain()
+    
+    def add_test_cache_data(self):
+        """Add test cache data for demonstration"""
+        test_responses = {
+            "http://example.com/test1": {
+                "content": b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nCache-Control: max-age=86400\r\n\r\n<html><body><h1>Test Page 1</h1></body></html>",
+                "content_type": "text/html"
+            },
+            "http://example.com/test2": {
+                "content": b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nCache-Control: max-age=86400\r\n\r\n{\"message\": \"Test JSON data\", \"status\": \"success\"}",
+                "content_type": "application/json"
+            },
             "http://test.com/data": {
-                "content": b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\nThis is test plain text content for caching demonstration.",
+                "content": b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nCache-Control: max-age=86400\r\n\r\nThis is test plain text content for caching demonstration.",
                 "content_type": "text/plain"
             },
             "http://demo.org/api/info": {
-                "content": b"HTTP/1.1 200 OK\r\nContent-Type: application/xml\r\n\r\n<response><status>success</status><data>Test XML data</data></response>",
+                "content": b"HTTP/1.1 200 OK\r\nContent-Type: application/xml\r\nCache-Control: max-age=86400\r\n\r\n<response><status>success</status><data>Test XML data</data></response>",
                 "content_type": "application/xml"
             }
         }
@@ -1935,27 +5134,240 @@ body {
             self.cache_response(url, data["content"])
         
         print("Added test cache data")
+        self.publish_updates()
     
     def get_cached_response(self, url):
-        """Get cached response for URL"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT response_data FROM cache WHERE url = ?", (url,))
-        result = cursor.fetchone()
-        return result[0] if result else None
-    
-    def cache_response(self, url, response_data):
-        """Cache response for URL"""
+        """Get cached response for URL, fresh or not"""
+        entry = self.get_cache_entry(url)
+        if entry is None:
+            return None
+        if entry.get('blob'):
+            return entry['response'] + self.blob_store.read(entry['blob'])
+        return entry['response']
+    
+    def get_cache_entry(self, url):
+        """Get cache entry {response, stored, expires, blob} for URL, from memory if it's hot.
+        The response of an entry with a blob is only the head, the body is in the blob store"""
+        entry = self.cache.get(url)
+        if entry is not None and entry.get('blob') and not os.path.exists(self.blob_store.path(entry['blob'])):
+            # Evicted or replaced by another process
+            self.forget_cache_entry(url)
+            entry = None
+        if entry is not None:
+            self.count_cache_lookup('memory', 'hits')
+            self.record_cache_access(url)
+            return entry
+        self.count_cache_lookup('memory', 'misses')
+        
+        result = self.db.fetchone("SELECT response_data, timestamp, expires, blob, encodings FROM cache WHERE url = ?", (url,))
+        if not result or (result[3] and not os.path.exists(self.blob_store.path(result[3]))):
+            self.count_cache_lookup('sqlite', 'misses')
+            return None
+        
+        self.count_cache_lookup('sqlite', 'hits')
+        self.record_cache_access(url)
+        entry = {'response': result[0], 'stored': float(result[1]), 'expires': result[2], 'blob': result[3],
+                 'key': url, 'encodings': tuple(filter(None, (result[4] or '').split(',')))}
+        self.cache.put(url, entry, len(result[0]))
+        return entry
+    
+    def get_encoded_entry(self, url, encoding):
+        """Get the {response, blob} of a compressed variant of a cache entry, None if it's gone"""
+        variant = self.cache.get((url, encoding))
+        if variant is not None and (not variant.get('blob') or os.path.exists(self.blob_store.path(variant['blob']))):
+            return variant
+        result = self.db.fetchone("SELECT response_data, blob FROM cache_encodings WHERE url = ? AND encoding = ?", (url, encoding))
+        if not result or (result[1] and not os.path.exists(self.blob_store.path(result[1]))):
+            return None
+        variant = {'response': result[0], 'blob': result[1]}
+        self.cache.put((url, encoding), variant, len(result[0]))
+        return variant
+    
+    def record_cache_access(self, url):
+        """Remember a cache hit for the eviction policy, flushed to SQLite in the background"""
+        with self.cache_accesses_lock:
+            access = self.cache_accesses.get(url)
+            if access is None:
+                self.cache_accesses[url] = [time.time(), 1]
+            else:
+                access[0] = time.time()
+                access[1] += 1
+    
+    def count_cache_lookup(self, tier, outcome):
+        """Count a hit or miss in one cache tier"""
+        with self.cache_counters_lock:
+            self.cache_counters[tier][outcome] += 1
+    
+    def store_response(self, cache_url, request_headers, response_data, blob=None):
+        """Cache a response under the key of the variant the request selected, returns the new cache entry"""
+        vary = vary_names(parse_http_head(response_data[:response_data.find(b'\r\n\r\n')])[1])
+        self.vary_index.put(cache_url, vary, len(cache_url) + len(vary))
+        return self.cache_response(variant_key(cache_url, vary, request_headers), response_data, cache_url, vary, blob)
+    
+    def cache_response(self, url, response_data, base_key=None, vary='', blob=None):
+        """Cache response for URL (a cache key), returns the new cache entry. With blob, response_data
+        is only the head of a body already in the blob store"""
         try:
-            cursor = self.conn.cursor()
+            stored = time.time()
+            head_end = response_data.find(b'\r\n\r\n')
+            _, headers = parse_http_head(response_data[:head_end])
+            expires = stored + freshness_lifetime(headers, stored) - initial_age(headers, stored)
+            
+            size = len(response_data)
+            if blob is not None:
+                size += os.path.getsize(self.blob_store.path(blob))
+            elif self.cache_blob_min_size is not None and size - head_end - 4 >= self.cache_blob_min_size:
+                blob = self.blob_store.put(response_data[head_end + 4:])
+                response_data = response_data[:head_end + 4]
+            
             content_type = self.extract_content_type(response_data)
-            cursor.execute(
-                "INSERT OR REPLACE INTO cache (url, response_data, timestamp, content_type) VALUES (?, ?, ?, ?)",
-                (url, response_data, time.time(), content_type)
-            )
-            self.conn.commit()
+            replaced = self.db.write(self.upsert_cache_entry,
+                                     (url, response_data, stored, content_type, expires, size, stored, base_key or url, vary, blob,
+                                      url_host(url)))
+            if replaced:
+                self.count_cache_change(replaced[0], -1, -replaced[1])
+            self.count_cache_change(content_type, 1, size)
+            entry = {'response': response_data, 'stored': stored, 'expires': expires, 'blob': blob,
+                     'key': url, 'encodings': ()}
+            self.cache.put(url, entry, len(response_data))
+            
+            if self.cache_compress and self.should_compress(headers, content_type, size - head_end - 4):
+                try:
+                    self.compress_queue.put_nowait((url, stored, response_data, blob))
+                except queue.Full:
+                    print(f"Compression backlogged, not compressing: {url}")
+            return entry
         except Exception as e:
             print(f"Error caching response: {e}")
     
+    def upsert_cache_entry(self, conn, row):
+        """Insert or replace a cache row and drop what the replaced one left behind (writer thread),
+        returns the (content type, size) of the replaced row or None"""
+        url, blob = row[0], row[9]
+        cursor = conn.cursor()
+        cursor.execute("SELECT blob, encodings, content_type, size FROM cache WHERE url = ?", (url,))
+        replaced = cursor.fetchone()
+        # Upsert so a refreshed entry keeps its hit count
+        cursor.execute(
+            """INSERT INTO cache (url, response_data, timestamp, content_type, expires, size, last_access, hits,
+                                  base_key, vary, blob, host)
+               VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?)
+               ON CONFLICT (url) DO UPDATE SET
+                   response_data = excluded.response_data, timestamp = excluded.timestamp,
+                   content_type = excluded.content_type, expires = excluded.expires,
+                   size = excluded.size, last_access = excluded.last_access,
+                   base_key = excluded.base_key, vary = excluded.vary, blob = excluded.blob,
+                   encodings = '', host = excluded.host""",
+            row
+        )
+        if replaced:
+            released = self.drop_encodings(cursor, url, replaced[1])
+            if replaced[0] and replaced[0] != blob:
+                released.append(replaced[0])
+            self.release_blobs(cursor, released)
+            return replaced[2], replaced[3] or 0
+        return None
+    
+    def count_cache_change(self, content_type, count, size):
+        """Update the cache totals and per content type aggregates"""
+        for name, value in cache_metrics(content_type, count, size).items():
+            self.metrics.add(name, value)
+    
+    def should_compress(self, headers, content_type, body_size):
+        """Whether a response is worth storing compressed variants of"""
+        return (body_size >= self.cache_compress_min_size
+                and is_compressible(content_type)
+                and get_header(headers, 'content-encoding', 'identity').lower() == 'identity'
+                and 'no-transform' not in parse_cache_control(get_header(headers, 'cache-control', ''))
+                and (get_header(headers, 'vary') or '').strip() != '*')
+    
+    def start_compressors(self):
+        """Start the threads that make compressed variants of cached entries"""
+        if not self.cache_compress:
+            return
+        for index in range(self.cache_compress_workers):
+            compressor = threading.Thread(target=self.compressor_loop, name=f'compressor-{index}', daemon=True)
+            compressor.start()
+            self.compressors.append(compressor)
+    
+    def stop_compressors(self):
+        """Stop the compressor threads once they finish their current entry"""
+        for _ in self.compressors:
+            self.compress_queue.put(None)
+        self.compressors = []
+    
+    def compressor_loop(self):
+        """Compress queued cache entries one at a time until stopped"""
+        while True:
+            job = self.compress_queue.get()
+            if job is None:
+                break
+            self.compress_cache_entry(*job)
+    
+    def compress_cache_entry(self, url, stored, response_data, blob):
+        """Store compressed variants of the cache entry for URL, unless it's replaced meanwhile"""
+        try:
+            head_end = response_data.find(b'\r\n\r\n')
+            head = response_data[:head_end + 4]
+            body = self.blob_store.read(blob) if blob else response_data[head_end + 4:]
+            
+            variants = []
+            for encoding, compress in COMPRESSORS.items():
+                compressed = compress(body)
+                # Not worth a second copy if it barely shrinks
+                if len(compressed) > len(body) * 0.9:
+                    continue
+                variant = encoded_head(head, encoding, len(compressed))
+                variant_blob = None
+                if self.cache_blob_min_size is not None and len(compressed) >= self.cache_blob_min_size:
+                    variant_blob = self.blob_store.put(compressed)
+                else:
+                    variant += compressed
+                variants.append((encoding, variant, variant_blob, len(variant) + (len(compressed) if variant_blob else 0)))
+            if not variants:
+                return
+            
+            encodings = ','.join(encoding for encoding, _, _, _ in variants)
+            if not self.db.write(self.insert_encodings, url, stored, encodings, variants):
+                return
+            
+            entry = self.cache.get(url)
+            if entry is not None and entry['stored'] == stored:
+                self.cache.put(url, dict(entry, encodings=tuple(encodings.split(','))), len(entry['response']))
+            print(f"Compressed cache entry ({encodings}): {url}")
+        except Exception as e:
+            print(f"Error compressing cache entry: {e}")
+    
+    def insert_encodings(self, conn, url, stored, encodings, variants):
+        """Add compressed variants to the cache entry for URL if it's still the one stored at stored
+        (writer thread), returns whether it was"""
+        cursor = conn.cursor()
+        added = sum(size for _, _, _, size in variants)
+        cursor.execute("UPDATE cache SET encodings = ?, size = size + ? WHERE url = ? AND timestamp = ?",
+                       (encodings, added, url, stored))
+        if not cursor.rowcount:
+            self.release_blobs(cursor, [variant_blob for _, _, variant_blob, _ in variants if variant_blob])
+            return False
+        cursor.executemany(
+            "INSERT OR REPLACE INTO cache_encodings (url, encoding, response_data, blob, size) VALUES (?, ?, ?, ?, ?)",
+            [(url,) + variant for variant in variants]
+        )
+        # The row's size now includes the variants, replacing or evicting it takes them off again
+        cursor.execute("SELECT content_type FROM cache WHERE url = ?", (url,))
+        self.count_cache_change(cursor.fetchone()[0], 0, added)
+        return True
+    
+    def drop_encodings(self, cursor, url, encodings):
+        """Delete the compressed variants of a cache entry, returns the blobs they used"""
+        if not encodings:
+            return []
+        cursor.execute("SELECT blob FROM cache_encodings WHERE url = ? AND blob IS NOT NULL", (url,))
+        blobs = [blob for (blob,) in cursor.fetchall()]
+        cursor.execute("DELETE FROM cache_encodings WHERE url = ?", (url,))
+        for encoding in encodings.split(','):
+            self.cache.pop((url, encoding))
+        return blobs
+    
     def extract_content_type(self, response_data):
         """Extract content type from response"""
         try:
@@ -1979,20 +5391,16 @@ body {
         except:
             return 0
     
-    def log_request(self, client_ip, method, url, status_code, response_size):
-        """Log request to database"""
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-        
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "INSERT INTO request_logs (timestamp, client_ip, method, url, status_code, response_size) VALUES (?, ?, ?, ?, ?, ?)",
-            (timestamp, client_ip, method, url, status_code, response_size)
-        )
-        self.conn.commit()
+    def log_request(self, client_ip, method, url, status_code, response_size, host=None):
+        """Queue a request log record for the log writer. host is the one the request was parsed
+        for, an origin-form URL doesn't carry it"""
+        now = time.time()
+        host = host.lower() if host else url_host(url)
+        self.queue_log_record((int(now), client_ip, method, url, status_code, response_size, host))
         
         # Also keep in memory for quick access
         log_entry = {
-            'timestamp': timestamp,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now)),
             'client_ip': client_ip,
             'method': method,
             'url': url,
@@ -2005,8 +5413,67 @@ body {
         if len(self.request_logs) > 1000:
             self.request_logs = self.request_logs[-1000:]
     
-    def send_blocked_response(self, client_socket, domain):
-        """Send blocked domain response"""
+    def queue_log_record(self, record):
+        """Hand a record to the log writer, shedding records if it can't keep up"""
+        with self.log_lock:
+            if self.log_overflow == 'sample' and self.log_queue.qsize() >= self.log_queue.maxsize // 2:
+                # Past half full, keep one record in log_sample_rate so the log still shows the traffic mix
+                self.log_sample_counter += 1
+                if self.log_sample_counter % self.log_sample_rate:
+                    self.log_stats['sampled_out'] += 1
+                    return
+            try:
+                self.log_queue.put_nowait(record)
+                self.log_stats['queued'] += 1
+            except queue.Full:
+                self.log_stats['dropped'] += 1
+    
+    def start_log_writer(self):
+        self.log_writer = threading.Thread(target=self.log_writer_loop, name='log-writer', daemon=True)
+        self.log_writer.start()
+    
+    def stop_log_writer(self):
+        """Write the queued records and stop the log writer"""
+        if self.log_writer is None:
+            return
+        self.log_queue.put(None)
+        self.log_writer.join(timeout=10)
+        self.log_writer = None
+    
+    def log_writer_loop(self):
+        """Write queued log records in batches, when log_batch_size are waiting or every log_flush_interval"""
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.time() + self.log_flush_interval
+            while len(batch) < self.log_batch_size:
+                try:
+                    record = self.log_queue.get(timeout=max(0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            if batch:
+                self.write_log_records(batch)
+    
+    def write_log_records(self, records):
+        """Insert a batch of log records in one transaction"""
+        try:
+            self.db.write(lambda conn: conn.executemany(
+                """INSERT INTO request_logs (timestamp, client_ip, method, url, status_code, response_size, host)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                records
+            ))
+            self.metrics.add('requests', len(records))
+            with self.log_lock:
+                self.log_stats['written'] += len(records)
+        except sqlite3.Error as e:
+            print(f"Error writing request logs: {e}")
+    
+    def build_blocked_response(self, domain):
+        """Build blocked domain response"""
         response = f"""HTTP/1.1 403 Forbidden
 Content-Type: text/html
 Connection: close
@@ -2018,10 +5485,10 @@ Connection: close
 <p>Access to {domain} has been blocked by the proxy server.</p>
 </body>
 </html>"""
-        client_socket.sendall(response.encode('utf-8'))
+        return response.encode('utf-8')
     
-    def send_error_response(self, client_socket, status_code, message):
-        """Send error response"""
+    def build_error_response(self, status_code, message):
+        """Build error response"""
         response = f"""HTTP/1.1 {status_code} {message}
 Content-Type: text/html
 Connection: close
@@ -2033,42 +5500,159 @@ Connection: close
 <p>The proxy server encountered an error while processing your request.</p>
 </body>
 </html>"""
-        client_socket.sendall(response.encode('utf-8'))
+        return response.encode('utf-8')
+    
+    def send_blocked_response(self, client_socket, domain):
+        """Send blocked domain response"""
+        client_socket.sendall(self.build_blocked_response(domain))
+    
+    def send_error_response(self, client_socket, status_code, message):
+        """Send error response"""
+        client_socket.sendall(self.build_error_response(status_code, message))
     
     def add_blocked_domain(self, domain):
         """Add domain to blocked list"""
         self.blocked_domains.add(domain)
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT OR IGNORE INTO blocked_domains (domain) VALUES (?)", (domain,))
-        self.conn.commit()
+        self.db.write(lambda conn: conn.execute("INSERT OR IGNORE INTO blocked_domains (domain) VALUES (?)", (domain,)))
+        self.broadcast_to_workers('blocked_domains', list(self.blocked_domains))
+        self.events.publish('blocked_domains', sorted(self.blocked_domains))
+        self.publish_updates()
     
     def remove_blocked_domain(self, domain):
         """Remove domain from blocked list"""
         if domain in self.blocked_domains:
             self.blocked_domains.remove(domain)
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM blocked_domains WHERE domain = ?", (domain,))
-        self.conn.commit()
+        self.db.write(lambda conn: conn.execute("DELETE FROM blocked_domains WHERE domain = ?", (domain,)))
+        self.broadcast_to_workers('blocked_domains', list(self.blocked_domains))
+        self.events.publish('blocked_domains', sorted(self.blocked_domains))
+        self.publish_updates()
+    
+    def set_cache_enabled(self, enabled):
+        """Enable or disable caching"""
+        self.cache_enabled = enabled
+        self.broadcast_to_workers('cache_enabled', enabled)
+        self.publish_updates()
+    
+    def cache_maintenance_loop(self, evict=True):
+        """Periodically flush access statistics and evict entries over the cache bounds"""
+        while self.is_running:
+            time.sleep(self.cache_maintenance_interval)
+            try:
+                self.flush_cache_accesses()
+                if evict:
+                    self.evict_cache_entries()
+                    self.db.write(self.vacuum_free_pages)
+            except sqlite3.Error as e:
+                print(f"Error maintaining cache: {e}")
+    
+    def flush_cache_accesses(self):
+        """Write the hits recorded since the last flush in one batch"""
+        with self.cache_accesses_lock:
+            accesses, self.cache_accesses = self.cache_accesses, {}
+        if accesses:
+            self.db.write(lambda conn: conn.executemany(
+                "UPDATE cache SET last_access = MAX(COALESCE(last_access, 0), ?), hits = hits + ? WHERE url = ?",
+                [(last_access, hits, url) for url, (last_access, hits) in accesses.items()]
+            ))
+    
+    def evict_cache_entries(self, batch_size=100, low_watermark=0.9):
+        """Evict least recently (lru) or least frequently (lfu) used entries until the cache is
+        back under its bounds, in small transactions so requests are never held up for long"""
+        order = 'last_access' if self.cache_eviction == 'lru' else 'hits, last_access'
+        # The counters are enough to tell the cache is within bounds, so most ticks never touch SQLite
+        entries = self.metrics.get('cached_items', self.get_process_metric('cached_items'))
+        size = self.metrics.get('cache_size', self.get_process_metric('cache_size'))
+        if entries <= self.cache_max_entries and size <= self.cache_max_size:
+            return
+        # Worker counts arrive with their next report, the table has the exact totals
+        entries, size = self.db.fetchone("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache")
+        if entries <= self.cache_max_entries and size <= self.cache_max_size:
+            return
+        
+        # Evict a little below the limits so we don't run again on the next insert
+        target_entries = int(self.cache_max_entries * low_watermark)
+        target_size = int(self.cache_max_size * low_watermark)
+        evicted = 0
+        while (entries > target_entries or size > target_size) and self.is_running:
+            victims = self.db.write(self.delete_cache_victims, order, batch_size,
+                                    entries - target_entries, size - target_size)
+            if not victims:
+                break
+            for url, victim_size, content_type in victims:
+                self.count_cache_change(content_type, -1, -(victim_size or 0))
+                self.forget_cache_entry(url)
+                entries -= 1
+                size -= victim_size or 0
+            evicted += len(victims)
+            # Workers keep their own memory tiers
+            self.broadcast_to_workers('forget_cache_entries', [url for url, _, _ in victims])
+            # Give request threads a turn at the database between batches
+            time.sleep(0)
+        
+        self.cache_evictions += evicted
+        print(f"Evicted {evicted} cache entries ({self.cache_eviction})")
+    
+    def delete_cache_victims(self, conn, order, batch_size, excess_entries, excess_size):
+        """Delete up to batch_size entries in eviction order until the excess is gone (writer thread),
+        returns the [(url, size, content type)] deleted"""
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT url, size, blob, encodings, content_type FROM cache ORDER BY {order} LIMIT ?", (batch_size,))
+        victims = []
+        blobs = []
+        for url, size, blob, encodings, content_type in cursor.fetchall():
+            if excess_entries <= 0 and excess_size <= 0:
+                break
+            victims.append((url, size, content_type))
+            if blob:
+                blobs.append(blob)
+            blobs += self.drop_encodings(cursor, url, encodings)
+            excess_entries -= 1
+            excess_size -= size or 0
+        cursor.executemany("DELETE FROM cache WHERE url = ?", [(url,) for url, _, _ in victims])
+        self.release_blobs(cursor, blobs)
+        return victims
+    
+    def release_blobs(self, cursor, blobs):
+        """Delete stored bodies that no cache entry refers to any more (writer thread)"""
+        for blob in set(blobs):
+            cursor.execute("SELECT 1 FROM cache WHERE blob = ? UNION ALL SELECT 1 FROM cache_encodings WHERE blob = ? LIMIT 1",
+                           (blob, blob))
+            if cursor.fetchone() is None:
+                self.blob_store.delete(blob)
+    
+    def vacuum_free_pages(self, conn, max_pages=2048):
+        """Return up to max_pages free database pages to the filesystem (writer thread)"""
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages:
+            # executescript steps the pragma to completion, execute() would free a single page
+            conn.executescript(f"PRAGMA incremental_vacuum({min(free_pages, max_pages)});")
     
     def clear_cache(self):
         """Clear the cache"""
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM cache")
-        self.conn.commit()
+        self.db.write(self.delete_cache_entries)
+        for name in self.get_metric_names():
+            if name.startswith(('cached_items', 'cache_size')):
+                self.metrics.reset(name, self.get_process_metric(name))
         self.cache.clear()
+        self.events.publish('cache_cleared', {})
+        self.publish_updates()
+        self.vary_index.clear()
+        self.broadcast_to_workers('clear_memory_cache', None)
         print("Cache cleared")
     
+    def delete_cache_entries(self, conn):
+        """Delete every cache entry and stored body (writer thread)"""
+        conn.execute("DELETE FROM cache")
+        conn.execute("DELETE FROM cache_encodings")
+        self.blob_store.clear()
+    
     def get_stats(self):
         """Get proxy server statistics"""
-        cursor = self.conn.cursor()
-        
         # Total requests
-        cursor.execute("SELECT COUNT(*) FROM request_logs")
-        total_requests = cursor.fetchone()[0]
+        total_requests = self.metrics.get('requests', self.get_process_metric('requests'))
         
         # Cache hits
-        cursor.execute("SELECT COUNT(*) FROM cache")
-        cached_items = cursor.fetchone()[0]
+        cached_items = self.metrics.get('cached_items', self.get_process_metric('cached_items'))
         
         # Blocked domains count
         blocked_count = len(self.blocked_domains)
@@ -2077,84 +5661,290 @@ Connection: close
             'total_requests': total_requests,
             'cached_items': cached_items,
             'blocked_domains': blocked_count,
+            'cache_enabled': self.cache_enabled,
             'is_running': self.is_running,
-            'server_address': f"{self.host}:{self.port}"
+            'server_address': f"{self.host}:{self.port}",
+            'worker_pool': self.get_pool_stats(),
+            'upstream_pool': self.get_upstream_pool_stats(),
+            'coalescing': self.get_coalescing_stats(),
+            'logging': self.get_log_stats(),
+            'processes': [dict(stats, index=index) for index, stats in sorted(self.process_stats.items())]
         }
     
     def get_cache_stats(self):
         """Get detailed cache statistics"""
-        cursor = self.conn.cursor()
-        
         # Total cached items
-        cursor.execute("SELECT COUNT(*) FROM cache")
-        total_cached = cursor.fetchone()[0]
+        total_cached = self.metrics.get('cached_items', self.get_process_metric('cached_items'))
         
         # Cache size in kB
-        cursor.execute("SELECT SUM(LENGTH(response_data)) FROM cache")
-        cache_size_bytes = cursor.fetchone()[0] or 0
+        cache_size_bytes = self.metrics.get('cache_size', self.get_process_metric('cache_size'))
         cache_size_kb = round(cache_size_bytes / 1024, 2)
         
-        # Cache by content type
-        cursor.execute("""
-            SELECT content_type, COUNT(*) as count, SUM(LENGTH(response_data)) as size 
-            FROM cache 
-            GROUP BY content_type
-        """)
+        # Cache by content type, from the per type counters
         cache_by_type = []
-        for row in cursor.fetchall():
+        for name in sorted(self.get_metric_names()):
+            if not name.startswith('cached_items:'):
+                continue
+            count = self.metrics.get(name, self.get_process_metric(name))
+            if count <= 0:
+                continue
+            content_type = name[len('cached_items:'):]
+            size_name = f"cache_size:{content_type}"
             cache_by_type.append({
-                'content_type': row[0],
-                'count': row[1],
-                'size': row[2]
+                'content_type': content_type,
+                'count': count,
+                'size': self.metrics.get(size_name, self.get_process_metric(size_name))
             })
         
         return {
             'total_cached': total_cached,
             'cache_size_kb': cache_size_kb,
-            'cache_by_type': cache_by_type
+            'cache_by_type': cache_by_type,
+            'tiers': self.get_cache_tier_stats(),
+            'eviction': {
+                'policy': self.cache_eviction,
+                'max_size_kb': round(self.cache_max_size / 1024, 2),
+                'max_entries': self.cache_max_entries,
+                'evicted': self.cache_evictions
+            }
         }
     
-    def get_cached_urls(self):
-        """Get list of cached URLs"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT url, content_type, timestamp, LENGTH(response_data) as size 
-            FROM cache 
-            ORDER BY timestamp DESC
-        """)
+    def get_metric_names(self):
+        """Names of the counters of this process and the worker processes"""
+        names = self.metrics.names()
+        for stats in list(self.process_stats.values()):
+            names.update(stats['metrics'])
+        return names
+    
+    def get_process_metric(self, name):
+        """Changes to a counter made by the worker processes"""
+        return sum(stats['metrics'].get(name, 0) for stats in list(self.process_stats.values()))
+    
+    def get_cache_tier_stats(self):
+        """Get hit/miss counters per cache tier, summed over worker processes if there are any"""
+        if self.process_stats:
+            return sum_stats([stats['cache_tiers'] for stats in self.process_stats.values()])
+        
+        with self.cache_counters_lock:
+            tiers = {tier: dict(counters) for tier, counters in self.cache_counters.items()}
+        tiers['memory'].update(self.cache.get_stats())
+        return tiers
+    
+    def get_coalescing_stats(self):
+        """Get upstream fetches started on a miss and requests that shared them instead of fetching"""
+        if self.process_stats:
+            return sum_stats([stats['coalescing'] for stats in self.process_stats.values()])
+        
+        with self.flights_lock:
+            return dict(self.coalescing_stats)
+    
+    def get_log_stats(self):
+        """Get request log records queued, written and shed under overload"""
+        if self.process_stats:
+            return sum_stats([stats['logging'] for stats in self.process_stats.values()])
+        
+        with self.log_lock:
+            return dict(self.log_stats, backlog=self.log_queue.qsize())
+    
+    def get_cached_urls(self, prefix='', domain='', content_type='', sort='timestamp', descending=True,
+                        cursor=None, limit=50):
+        """Get one page of cached URLs, filtered by URL prefix, host and content type. Pages are
+        keyset-paginated: pass the returned next_cursor to get the page after this one"""
+        if sort not in self.CACHE_SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(self.CACHE_SORT_KEYS)}")
+        limit = max(1, min(int(limit), self.MAX_PAGE_SIZE))
+        keys = self.CACHE_SORT_KEYS[sort] + ('rowid',)
+        
+        conditions = []
+        params = []
+        if prefix:
+            low, high = prefix_bounds(prefix)
+            conditions.append("url >= ?")
+            params.append(low)
+            if high is not None:
+                conditions.append("url < ?")
+                params.append(high)
+        if domain:
+            conditions.append("host = ?")
+            params.append(domain.lower())
+        if content_type:
+            conditions.append("content_type = ?")
+            params.append(content_type)
+        if cursor:
+            # Rows strictly after the last one of the previous page, in sort order
+            conditions.append(f"({', '.join(keys)}) {'<' if descending else '>'} ({', '.join('?' * len(keys))})")
+            params.extend(decode_cursor(cursor, len(keys)))
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        direction = 'DESC' if descending else 'ASC'
+        rows = self.db.fetchall(
+            f"""SELECT url, content_type, timestamp, size, hits, {', '.join(keys)} FROM cache {where}
+                ORDER BY {', '.join(f'{key} {direction}' for key in keys)} LIMIT ?""",
+            params + [limit + 1]
+        )
         cached_items = []
-        for row in cursor.fetchall():
+        for row in rows[:limit]:
             cached_items.append({
                 'url': row[0],
                 'content_type': row[1],
                 'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(float(row[2]))),
-                'size': row[3]
+                'size': row[3],
+                'hits': row[4]
             })
-        return cached_items
+        next_cursor = encode_cursor(list(rows[limit - 1][5:])) if len(rows) > limit else None
+        return {'items': cached_items, 'next_cursor': next_cursor}
     
     def get_recent_logs(self, limit=50):
         """Get recent request logs"""
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT timestamp, client_ip, method, url, status_code, response_size FROM request_logs ORDER BY id DESC LIMIT ?",
-            (limit,)
+        return self.query_logs(limit=limit)['items']
+    
+    def log_conditions(self, since=None, until=None, client_ip='', method='', status_min=None, status_max=None,
+                       prefix='', host='', after_id=None):
+        """WHERE conditions and parameters for the request log filters, times are epoch seconds"""
+        conditions = []
+        params = []
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(int(after_id))
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(int(since))
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(int(until))
+        if client_ip:
+            conditions.append("client_ip = ?")
+            params.append(client_ip)
+        if method:
+            conditions.append("method = ?")
+            params.append(method.upper())
+        if status_min is not None:
+            conditions.append("status_code >= ?")
+            params.append(int(status_min))
+        if status_max is not None:
+            conditions.append("status_code <= ?")
+            params.append(int(status_max))
+        if prefix:
+            low, high = prefix_bounds(prefix)
+            conditions.append("url >= ?")
+            params.append(low)
+            if high is not None:
+                conditions.append("url < ?")
+                params.append(high)
+            # A prefix that spells out the host can use the host index
+            if not host and re.match(r'[a-zA-Z][a-zA-Z0-9+.-]*://[^/?#]+[/?#]', prefix):
+                host = url_host(prefix)
+        if host:
+            conditions.append("host = ?")
+            params.append(host.lower())
+        return conditions, params
+    
+    def query_logs(self, cursor=None, limit=100, descending=True, **filters):
+        """Get one page of request logs matching the filters (see log_conditions), newest first unless
+        descending is false. Pass the returned next_cursor to get the page after this one"""
+        limit = max(1, min(int(limit), self.MAX_PAGE_SIZE))
+        conditions, params = self.log_conditions(**filters)
+        if cursor:
+            conditions.append(f"id {'<' if descending else '>'} ?")
+            params.extend(decode_cursor(cursor, 1))
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = self.db.fetchall(
+            f"""SELECT timestamp, client_ip, method, url, status_code, response_size, id FROM request_logs {where}
+                ORDER BY id {'DESC' if descending else 'ASC'} LIMIT ?""",
+            params + [limit + 1]
         )
         logs = []
-        for row in cursor.fetchall():
+        for row in rows[:limit]:
             logs.append({
-                'timestamp': row[0],
+                'id': row[6],
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row[0])),
                 'client_ip': row[1],
                 'method': row[2],
                 'url': row[3],
                 'status_code': row[4],
                 'response_size': row[5]
             })
-        return logs
+        next_cursor = encode_cursor([rows[limit - 1][6]]) if len(rows) > limit else None
+        return {'items': logs, 'next_cursor': next_cursor}
+    
+    def get_top_talkers(self, by='client_ip', limit=20, **filters):
+        """Request count and bytes sent per client IP, host, method or status code for the request
+        logs matching the filters (see log_conditions), busiest first"""
+        if by not in self.LOG_GROUP_COLUMNS:
+            raise ValueError(f"by must be one of {', '.join(self.LOG_GROUP_COLUMNS)}")
+        limit = max(1, min(int(limit), self.MAX_PAGE_SIZE))
+        conditions, params = self.log_conditions(**filters)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = self.db.fetchall(
+            f"""SELECT {by}, COUNT(*), COALESCE(SUM(response_size), 0) FROM request_logs {where}
+                GROUP BY {by} ORDER BY COUNT(*) DESC LIMIT ?""",
+            params + [limit]
+        )
+        return [{by: row[0], 'requests': row[1], 'bytes': row[2]} for row in rows]
+    
+    def subscribe_events(self):
+        """Subscribe to the dashboard events, the subscriber queue starts with full stats and cache
+        statistics that later stats events only send the changes to"""
+        with self.event_lock:
+            if self.published_log_id is None:
+                self.published_log_id = self.db.fetchone("SELECT COALESCE(MAX(id), 0) FROM request_logs")[0]
+            # Bring the current subscribers up to these snapshots first, so later changes are
+            # computed against what every subscriber has
+            stats, cache_stats = self.publish_snapshots()
+            subscriber = self.events.subscribe()
+            subscriber.put(sse_message('stats', stats))
+            subscriber.put(sse_message('cache', cache_stats))
+        return subscriber
+    
+    def publish_snapshots(self):
+        """Publish the stats that changed and the cache statistics if they did since the last
+        snapshots (event_lock held), returns the new (stats, cache statistics)"""
+        stats = self.get_stats()
+        changed = {name: value for name, value in stats.items() if self.published_stats.get(name) != value}
+        if changed:
+            self.events.publish('stats', changed)
+        self.published_stats = stats
+        
+        cache_stats = self.get_cache_stats()
+        if cache_stats != self.published_cache_stats:
+            self.events.publish('cache', cache_stats)
+        self.published_cache_stats = cache_stats
+        return stats, cache_stats
+    
+    def publish_updates(self):
+        """Publish what changed since the last call: the stats that changed, cache statistics and the
+        newest request logs"""
+        with self.event_lock:
+            if not self.events.has_subscribers():
+                # Nobody is watching, the next subscriber starts from fresh snapshots
+                self.published_log_id = None
+                self.published_stats = {}
+                self.published_cache_stats = None
+                return
+            
+            self.publish_snapshots()
+            
+            # At most one page per interval, a live view only needs the newest entries
+            logs = self.query_logs(after_id=self.published_log_id, limit=self.MAX_PAGE_SIZE)['items']
+            if logs:
+                self.events.publish('logs', logs)
+                self.published_log_id = logs[0]['id']
+    
+    def event_publisher_loop(self):
+        """Periodically publish dashboard updates to the subscribed streams"""
+        while self.is_running:
+            time.sleep(self.event_interval)
+            try:
+                self.publish_updates()
+            except sqlite3.Error as e:
+                print(f"Error publishing dashboard events: {e}")
     
     def start_web_interface(self):
         """Start the web interface for monitoring"""
         from web_interface import app
         app.proxy_server = self
+        threading.Thread(target=self.event_publisher_loop, daemon=True).start()
         
         # Set template folder explicitly
         app.template_folder = 'templates'
@@ -2162,6 +5952,14 @@ Connection: close
         
         app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
 
+def run_worker_process(options, index, stats_queue, control_queue):
+    """Entry point of a proxy worker process"""
+    proxy = HTTPProxyServer(**dict(options, processes=1))
+    try:
+        proxy.serve_worker_process(index, stats_queue, control_queue)
+    except KeyboardInterrupt:
+        pass
+
 # For standalone execution
 if __name__ == "__main__":
     proxy = HTTPProxyServer(port=8080)
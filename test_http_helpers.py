@@ -0,0 +1,218 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from proxy_server import (
+    HTTPProxyServer, Flight, AsyncFlight, SocketReader, iter_body_async, request_framing, response_framing, parse_cache_control, freshness_lifetime, current_age,
+    normalize_url, vary_names, variant_key, parse_range, if_range_matches, range_response
+)
+
+def test_request_framing():
+    """Request bodies are delimited by chunks, a Content-Length, or not at all"""
+    assert request_framing([('Host', 'example.com')]) == ('none', 0)
+    assert request_framing([('Content-Length', '12')]) == ('length', 12)
+    assert request_framing([('Content-Length', '0')]) == ('none', 0)
+    assert request_framing([('Transfer-Encoding', 'gzip, chunked')]) == ('chunked', None)
+
+@pytest.mark.parametrize('headers', [
+    [('Transfer-Encoding', 'chunked'), ('Content-Length', '5')],
+    [('Content-Length', '5, 5')],
+    [('Content-Length', '5'), ('Content-Length', '5')],
+    [('Content-Length', '-1')],
+    [('Transfer-Encoding', 'chunked, gzip')],
+])
+def test_request_framing_rejects_ambiguous_bodies(headers):
+    """Framing another server could read differently is refused"""
+    with pytest.raises(ValueError):
+        request_framing(headers)
+
+def test_response_framing():
+    """Bodiless responses, chunks, lengths, and bodies that end when the connection does"""
+    assert response_framing('HEAD', 200, [('Content-Length', '10')]) == ('none', 0)
+    assert response_framing('GET', 304, []) == ('none', 0)
+    assert response_framing('GET', 200, [('Transfer-Encoding', 'chunked')]) == ('chunked', None)
+    assert response_framing('GET', 200, [('Content-Length', '10')]) == ('length', 10)
+    assert response_framing('GET', 200, []) == ('close', None)
+
+def test_parse_cache_control():
+    """Directive names are lower-cased, quoted arguments unquoted"""
+    assert parse_cache_control('Max-Age=60, no-cache="Set-Cookie", public') == {
+        'max-age': '60', 'no-cache': 'Set-Cookie', 'public': None
+    }
+    assert parse_cache_control(None) == {}
+
+def test_freshness_lifetime():
+    """s-maxage wins over max-age, which wins over Expires, then the Last-Modified heuristic"""
+    date = 'Thu, 01 Jan 2026 00:00:00 GMT'
+    assert freshness_lifetime([('Cache-Control', 'max-age=60, s-maxage=120')], 0) == 120
+    assert freshness_lifetime([('Cache-Control', 'max-age=60'), ('Expires', 'Fri, 02 Jan 2026 00:00:00 GMT')], 0) == 60
+    assert freshness_lifetime([('Date', date), ('Expires', 'Thu, 01 Jan 2026 01:00:00 GMT')], 0) == 3600
+    assert freshness_lifetime([('Date', date), ('Expires', '0')], 0) == 0
+    assert freshness_lifetime([('Date', date), ('Last-Modified', 'Wed, 31 Dec 2025 14:00:00 GMT')], 0) == 3600
+    assert freshness_lifetime([('Cache-Control', 'no-cache, max-age=60')], 0) == 0
+    assert freshness_lifetime([], 0) == 0
+
+def test_current_age():
+    """The Age a response arrived with plus its time in the cache"""
+    assert current_age([('Age', '30')], 1000, 1010) == 40
+    assert current_age([], 1000, 1000) == 0
+
+def test_normalize_url():
+    """Equivalent request targets share one cache key"""
+    assert normalize_url('/a%7eb?x=1#frag', 'Example.COM', 80) == 'http://example.com/a~b?x=1'
+    assert normalize_url('HTTP://Example.com:80', 'example.com', 80) == 'http://example.com/'
+    assert normalize_url('http://example.com:8080/p', 'example.com', 8080) == 'http://example.com:8080/p'
+    assert normalize_url('http://example.com/?b=2&utm_source=x&a=1', 'example.com', 80,
+                         sort_query=True, strip_params=('utm_*',)) == 'http://example.com/?a=1&b=2'
+    assert normalize_url('http://example.com/%2f', 'example.com', 80) == 'http://example.com/%2F'
+
+def test_variant_key():
+    """Responses that vary get one key per combination of the request's values"""
+    vary = vary_names([('Vary', 'Accept-Encoding, accept-language'), ('Vary', 'Accept-Encoding')])
+    assert vary == 'accept-encoding,accept-language'
+    key = variant_key('http://example.com/', vary, [('Accept-Encoding', 'gzip,  br')])
+    assert key == 'http://example.com/ [accept-encoding: gzip,br; accept-language: ]'
+    assert variant_key('http://example.com/', '', [('Accept-Encoding', 'gzip')]) == 'http://example.com/'
+
+def test_parse_range():
+    """Ranges are clipped to the body, sorted and merged, unusable headers are ignored"""
+    assert parse_range('bytes=0-9', 100) == [(0, 9)]
+    assert parse_range('bytes=90-', 100) == [(90, 99)]
+    assert parse_range('bytes=-10', 100) == [(90, 99)]
+    assert parse_range('bytes=50-200', 100) == [(50, 99)]
+    assert parse_range('bytes=20-29, 0-9, 5-14', 100) == [(0, 14), (20, 29)]
+    assert parse_range('bytes=100-', 100) == []
+    assert parse_range('bytes=9-0', 100) is None
+    assert parse_range('bytes=abc', 100) is None
+    assert parse_range('items=0-9', 100) is None
+    assert parse_range(None, 100) is None
+
+def test_if_range_matches():
+    """If-Range needs a strong validator equal to the stored one"""
+    headers = [('ETag', '"v1"'), ('Last-Modified', 'Thu, 01 Jan 2026 00:00:00 GMT')]
+    assert if_range_matches(None, headers)
+    assert if_range_matches('"v1"', headers)
+    assert not if_range_matches('"v2"', headers)
+    assert not if_range_matches('W/"v1"', headers)
+    assert if_range_matches('Thu, 01 Jan 2026 00:00:00 GMT', headers)
+
+def test_range_response():
+    """A 206 with one part, a multipart/byteranges body for several, a 416 for none"""
+    body = bytes(range(100))
+    headers = [('Content-Type', 'application/octet-stream'), ('Content-Length', '100')]
+    part = lambda first, last: body[first:last + 1]
+    
+    status, status_line, single, segments = range_response('HTTP/1.1 200 OK', headers, [(10, 19)], 100, part)
+    assert (status, status_line) == (206, 'HTTP/1.1 206 Partial Content')
+    assert ('Content-Range', 'bytes 10-19/100') in single and ('Content-Length', '10') in single
+    assert segments == [body[10:20]]
+    
+    status, _, multi, segments = range_response('HTTP/1.1 200 OK', headers, [(0, 1), (98, 99)], 100, part)
+    content = b''.join(segments)
+    assert status == 206
+    assert dict(multi)['Content-Type'].startswith('multipart/byteranges; boundary=')
+    assert int(dict(multi)['Content-Length']) == len(content)
+    assert b'Content-Range: bytes 98-99/100\r\n\r\n' + body[98:] in content
+    
+    status, _, unsatisfiable, segments = range_response('HTTP/1.1 200 OK', headers, [], 100, part)
+    assert status == 416 and segments == []
+    assert ('Content-Range', 'bytes */100') in unsatisfiable
+
+def test_close_delimited_body_ends_at_end_of_stream():
+    """Only the peer closing ends a body without a length"""
+    proxy_side, origin_side = socket.socketpair()
+    origin_side.sendall(b'whole body')
+    origin_side.close()
+    assert b''.join(SocketReader(proxy_side).iter_body('close', None)) == b'whole body'
+    proxy_side.close()
+
+def test_stalled_close_delimited_body_is_incomplete():
+    """A read timeout must not pass for the end of a body that has no length"""
+    proxy_side, origin_side = socket.socketpair()
+    proxy_side.settimeout(0.1)
+    origin_side.sendall(b'partial')
+    received = []
+    with pytest.raises(socket.timeout):
+        for chunk in SocketReader(proxy_side).iter_body('close', None):
+            received.append(chunk)
+    assert received == [b'partial']
+    proxy_side.close()
+    origin_side.close()
+
+def test_stalled_close_delimited_body_is_incomplete_async():
+    """Same for the asyncio engine"""
+    async def read_stalled_body():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b'partial')
+        return [chunk async for chunk in iter_body_async(reader, 'close', None, timeout=0.1)]
+    
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(read_stalled_body())
+
+BODY = bytes(range(256)) * 4096
+HEAD = b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\nCache-Control: max-age=60\r\n\r\n' % len(BODY)
+URL = 'http://origin.test/big'
+
+@pytest.fixture
+def proxy(tmp_path, monkeypatch):
+    """A server that isn't listening, with its database and web files in a scratch directory"""
+    monkeypatch.chdir(tmp_path)
+    server = HTTPProxyServer(port=0)
+    yield server
+    server.db.close()
+
+def send_body(sock):
+    """Play the origin: send the body after the head the test already passed in, then wait"""
+    threading.Thread(target=sock.sendall, args=(BODY,), daemon=True).start()
+
+def test_leader_client_disconnect_still_fills_flight(proxy):
+    """Followers get the whole response when the leader's own client goes away mid-body"""
+    upstream, origin = socket.socketpair()
+    client, gone = socket.socketpair()
+    gone.close()
+    send_body(origin)
+    flight = Flight()
+    followed = []
+    follower = threading.Thread(target=lambda: flight.wait_response() and followed.extend(flight.iter_chunks()))
+    follower.start()
+    
+    _, sent, keep_alive = proxy.relay_response(
+        client, 'GET', URL, [], True, ('origin.test', 80), upstream, SocketReader(upstream), HEAD, flight
+    )
+    follower.join(10)
+    assert not keep_alive and sent == 0
+    assert flight.complete and b''.join(followed) == BODY
+    assert proxy.db.fetchone("SELECT size FROM cache WHERE url = ?", (URL,))[0] > len(BODY)
+    client.close()
+    origin.close()
+
+def test_leader_client_disconnect_still_fills_flight_async(proxy):
+    """Same for the asyncio engine"""
+    async def relay():
+        upstream, origin = socket.socketpair()
+        client, gone = socket.socketpair()
+        gone.close()
+        send_body(origin)
+        connection = await asyncio.open_connection(sock=upstream)
+        _, writer = await asyncio.open_connection(sock=client)
+        flight = AsyncFlight()
+        
+        async def follow():
+            await flight.wait_response_async()
+            return [chunk async for chunk in flight.iter_chunks_async()]
+        
+        follower = asyncio.ensure_future(follow())
+        _, _, keep_alive = await proxy.relay_response_async(
+            writer, 'GET', URL, [], True, ('origin.test', 80), connection, HEAD, flight
+        )
+        followed = await asyncio.wait_for(follower, 10)
+        writer.close()
+        origin.close()
+        return keep_alive, flight.complete, b''.join(followed)
+    
+    keep_alive, complete, followed = asyncio.run(relay())
+    assert not keep_alive
+    assert complete and followed == BODY
+    assert proxy.db.fetchone("SELECT size FROM cache WHERE url = ?", (URL,))[0] > len(BODY)
@@ -1,5 +1,6 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 import os
+import queue
 
 app = Flask(__name__)
 app.proxy_server = None
@@ -26,19 +27,17 @@ def logs():
     if not app.proxy_server:
         return "Proxy server not initialized"
     
-    logs = app.proxy_server.get_recent_logs(100)
-    return render_template('logs.html', logs=logs)
+    stats = app.proxy_server.get_stats()
+    return render_template('logs.html', stats=stats)
 
 @app.route('/cache')
 def cache_view():
     if not app.proxy_server:
         return "Proxy server not initialized"
     
-    cached_items = app.proxy_server.get_cached_urls()
     cache_stats = app.proxy_server.get_cache_stats()
     
     return render_template('cache.html', 
-                         cached_items=cached_items,
                          cache_stats=cache_stats)
 
 @app.route('/api/stats')
@@ -55,6 +54,94 @@ def api_cache_stats():
     
     return jsonify(app.proxy_server.get_cache_stats())
 
+@app.route('/api/cache')
+def api_cache():
+    if not app.proxy_server:
+        return jsonify({'error': 'Proxy server not initialized'})
+    
+    try:
+        page = app.proxy_server.get_cached_urls(
+            prefix=request.args.get('prefix', ''),
+            domain=request.args.get('domain', ''),
+            content_type=request.args.get('content_type', ''),
+            sort=request.args.get('sort', 'timestamp'),
+            descending=request.args.get('order', 'desc') != 'asc',
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50, type=int)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(page)
+
+def log_filters():
+    """Request log filters from the query string"""
+    return {
+        'since': request.args.get('since', type=int),
+        'until': request.args.get('until', type=int),
+        'client_ip': request.args.get('client_ip', ''),
+        'method': request.args.get('method', ''),
+        'status_min': request.args.get('status_min', type=int),
+        'status_max': request.args.get('status_max', type=int),
+        'prefix': request.args.get('prefix', ''),
+        'host': request.args.get('host', '')
+    }
+
+@app.route('/api/logs')
+def api_logs():
+    if not app.proxy_server:
+        return jsonify({'error': 'Proxy server not initialized'})
+    
+    try:
+        page = app.proxy_server.query_logs(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 100, type=int),
+            descending=request.args.get('order', 'desc') != 'asc',
+            **log_filters()
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(page)
+
+@app.route('/api/logs/top')
+def api_logs_top():
+    if not app.proxy_server:
+        return jsonify({'error': 'Proxy server not initialized'})
+    
+    try:
+        top = app.proxy_server.get_top_talkers(
+            by=request.args.get('by', 'client_ip'),
+            limit=request.args.get('limit', 20, type=int),
+            **log_filters()
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(top)
+
+@app.route('/api/stream')
+def api_stream():
+    if not app.proxy_server:
+        return jsonify({'error': 'Proxy server not initialized'})
+    
+    proxy_server = app.proxy_server
+    subscriber = proxy_server.subscribe_events()
+    
+    def stream():
+        try:
+            while True:
+                try:
+                    yield subscriber.get(timeout=15)
+                except queue.Empty:
+                    # Keeps proxies from closing the idle stream and notices clients that left
+                    yield ': keepalive\n\n'
+        finally:
+            proxy_server.events.unsubscribe(subscriber)
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/block_domain', methods=['POST'])
 def api_block_domain():
     if not app.proxy_server:
@@ -93,7 +180,7 @@ def api_toggle_cache():
         return jsonify({'error': 'Proxy server not initialized'})
     
     enabled = request.form.get('enabled') == 'true'
-    app.proxy_server.cache_enabled = enabled
+    app.proxy_server.set_cache_enabled(enabled)
     return jsonify({'success': True, 'cache_enabled': enabled})
 
 @app.route('/api/add_test_cache', methods=['POST'])